@@ -1,60 +1,969 @@
+import base64
+import hashlib
+import heapq
 import json
 import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
 import psycopg2
-import jwt
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# jwt, gzip, csv и psycopg2.extras импортируются внутри функций, которым они нужны:
+# публичные списки не платят за них при холодном старте
+SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key')
+WARMUP_ON_IMPORT = os.environ.get('WARMUP_ON_IMPORT', '0') == '1'
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '1024'))
+TOKEN_CACHE_TTL = 300
+REVOCATION_SYNC_INTERVAL = int(os.environ.get('REVOCATION_SYNC_INTERVAL', '30'))
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_AGE = int(os.environ.get('DB_POOL_MAX_AGE', '300'))
+DB_POOL_PING_AFTER = int(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+# Горячие запросы выполняются через PREPARE/EXECUTE: разбор и план один раз
+# на соединение (PREPARED_STATEMENTS=0 отключает, например за pgbouncer)
+PREPARED_STATEMENTS = os.environ.get('PREPARED_STATEMENTS', '1') == '1'
+PREPARED_MAX_STATEMENTS = 256
+PREPARED_MAX_PER_CONNECTION = 64
+# Ошибки, после которых подготовленный запрос готовится заново:
+# statement не существует (сброс сессии) и смена типа результата после миграции
+PREPARED_RETRY_CODES = ('26000', '0A000')
+
+# Реплики для чтения: публичные списки и чтения без недавних записей
+# идут на них по кругу, записи и всё остальное — на основную базу
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get('REPLICA_CONNECT_TIMEOUT', '2'))
+REPLICA_RETRY_AFTER = int(os.environ.get('REPLICA_RETRY_AFTER', '30'))
+REPLICA_READ_ACTIONS = {
+    ('vacancies', 'list'), ('vacancies', 'search'), ('vacancies', 'get'),
+    ('companies', 'list'), ('resumes', 'my'), ('me', 'list'), ('batch', 'list'),
+    ('vacancies', 'export'), ('companies', 'export'), ('stats', 'list')
+}
+# Сколько секунд после записи чтения пользователя идут на основную базу
+READ_YOUR_WRITES_WINDOW = int(os.environ.get('READ_YOUR_WRITES_WINDOW', '10'))
+RECENT_WRITERS_MAX_ENTRIES = 1024
+
+# Трассировка запросов: лог пишется для доли TRACE_SAMPLE_RATE запросов,
+# а также для медленных запросов, медленных SQL и ошибок
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_SLOW_REQUEST_MS = float(os.environ.get('TRACE_SLOW_REQUEST_MS', '1000'))
+TRACE_SLOW_QUERY_MS = float(os.environ.get('TRACE_SLOW_QUERY_MS', '200'))
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', '1') == '1'
+TRACE_MAX_QUERIES = 50
+TRACE_SQL_MAX_LENGTH = 300
+
+# Шаблоны заголовков: ответы не меняются на месте, поэтому словари общие
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Credentials': 'true'
+}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization, If-None-Match, X-Last-Write-At',
+    'Access-Control-Max-Age': '86400',
+    'Access-Control-Allow-Credentials': 'true'
+}
+NOT_MODIFIED_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Credentials': 'true',
+    'Vary': 'Accept-Encoding'
+}
+
+# Статичные запросы собираются со схемой один раз при загрузке модуля
+SQL_REVOKED_ACTIVE = f'SELECT token_id, expires_at, revoked_at FROM "{SCHEMA}".revoked_tokens WHERE expires_at > %s'
+SQL_REVOKED_SINCE = f'SELECT token_id, expires_at, revoked_at FROM "{SCHEMA}".revoked_tokens WHERE revoked_at > %s'
+SQL_USER_PROFILE = f'SELECT id, email, full_name, phone, role, created_at FROM "{SCHEMA}".users WHERE id = %s'
+SQL_COMPANIES_PAGE = f"""
+    SELECT c.id, c.name, c.description, c.rating, c.reviews_count, c.website,
+           c.active_vacancies_count AS vacancies_count
+    FROM "{SCHEMA}".companies c
+    ORDER BY c.rating DESC, c.id DESC
+    LIMIT %s OFFSET %s
+"""
+SQL_COMPANIES_PAGE_AFTER = f"""
+    SELECT c.id, c.name, c.description, c.rating, c.reviews_count, c.website,
+           c.active_vacancies_count AS vacancies_count
+    FROM "{SCHEMA}".companies c
+    WHERE (c.rating, c.id) < (%s, %s)
+    ORDER BY c.rating DESC, c.id DESC
+    LIMIT %s OFFSET %s
+"""
+SQL_COMPANY_INSERT = f'INSERT INTO "{SCHEMA}".companies (name, description, website) VALUES (%s, %s, %s) RETURNING id'
+SQL_COMPANY_RECONCILE = f'SELECT "{SCHEMA}".reconcile_company_vacancy_counts()'
+SQL_VACANCY_INSERT = f"""
+    INSERT INTO "{SCHEMA}".vacancies
+    (company_id, title, description, salary_min, salary_max, location, employment_type, experience_required)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id
+"""
+SQL_IMPORT_COMPANY_IDS = f'SELECT id FROM "{SCHEMA}".companies WHERE id = ANY(%s)'
+SQL_IMPORT_UPSERT = f"""
+    INSERT INTO "{SCHEMA}".vacancies
+    (external_id, company_id, title, description, salary_min, salary_max,
+     location, employment_type, experience_required, is_active)
+    VALUES %s
+    ON CONFLICT (company_id, external_id) DO UPDATE SET
+        title = EXCLUDED.title,
+        description = EXCLUDED.description,
+        salary_min = EXCLUDED.salary_min,
+        salary_max = EXCLUDED.salary_max,
+        location = EXCLUDED.location,
+        employment_type = EXCLUDED.employment_type,
+        experience_required = EXCLUDED.experience_required,
+        is_active = EXCLUDED.is_active,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING (xmax = 0)
+"""
+SQL_MATCH_SKILL_NAMES = f'SELECT DISTINCT lower(skill_name) FROM "{SCHEMA}".skills'
+SQL_MATCH_SKILL_BITS = f"""
+    SELECT v.id, s.bit
+    FROM unnest(%s::text[], %s::int[]) AS s(name, bit)
+    JOIN "{SCHEMA}".vacancies v
+      ON v.is_active = TRUE AND v.id > %s
+     AND v.search_vector @@ (plainto_tsquery('russian', s.name) || plainto_tsquery('english', s.name))
+"""
+SQL_MATCH_VACANCIES = f"""
+    SELECT id, salary_min, salary_max, experience_required
+    FROM "{SCHEMA}".vacancies
+    WHERE is_active = TRUE AND id > %s
+"""
+# Резюме с навыками, агрегированными на стороне БД
+SQL_RESUME_SELECT = f"""
+    SELECT r.id, r.position, r.experience_years, r.education,
+           r.desired_salary, r.summary, r.created_at,
+           COALESCE(s.skills, '[]'::json) AS skills
+    FROM "{SCHEMA}".resumes r
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object('name', sk.skill_name, 'level', sk.proficiency_level) ORDER BY sk.id) AS skills
+        FROM "{SCHEMA}".skills sk
+        WHERE sk.resume_id = r.id
+    ) s ON TRUE
+"""
+SQL_RESUME_LATEST = SQL_RESUME_SELECT + 'WHERE r.user_id = %s ORDER BY r.created_at DESC LIMIT 1'
+SQL_RESUMES_BY_IDS = SQL_RESUME_SELECT + 'WHERE r.id = ANY(%s) ORDER BY r.id'
+SQL_RESUME_INSERT = f"""
+    INSERT INTO "{SCHEMA}".resumes
+    (user_id, position, experience_years, education, desired_salary, summary)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    RETURNING id
+"""
+SQL_SKILLS_INSERT = f"""
+    INSERT INTO "{SCHEMA}".skills (resume_id, skill_name, proficiency_level)
+    SELECT %s, t.name, t.level
+    FROM unnest(%s::text[], %s::text[]) AS t(name, level)
+"""
+SQL_SKILLS_SELECT = f'SELECT skill_name, proficiency_level FROM "{SCHEMA}".skills WHERE resume_id = %s'
+SQL_SKILLS_DELETE = f'DELETE FROM "{SCHEMA}".skills WHERE resume_id = %s AND skill_name = ANY(%s)'
+SQL_STATS_SELECT = f"""
+    SELECT dimension, key, label, vacancies_count,
+           salary_min_p25, salary_min_p50, salary_min_p75,
+           salary_max_p25, salary_max_p50, salary_max_p75
+    FROM "{SCHEMA}".vacancy_market_stats
+    ORDER BY dimension, vacancies_count DESC, key
+"""
+SQL_STATS_REFRESHED_AT = f"SELECT MAX(finished_at) FROM \"{SCHEMA}\".stats_refresh_log WHERE view_name = 'vacancy_market_stats'"
+SQL_STATS_RECENTLY_REFRESHED = f"""
+    SELECT EXISTS (
+        SELECT 1 FROM "{SCHEMA}".stats_refresh_log
+        WHERE view_name = 'vacancy_market_stats' AND finished_at > LOCALTIMESTAMP - %s * INTERVAL '1 second'
+    )
+"""
+SQL_STATS_REFRESH = f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{SCHEMA}".vacancy_market_stats'
+SQL_STATS_LOG_INSERT = f"""
+    INSERT INTO "{SCHEMA}".stats_refresh_log (view_name, source, duration_ms, finished_at)
+    VALUES ('vacancy_market_stats', %s, %s, clock_timestamp()::TIMESTAMP)
+    RETURNING finished_at
+"""
+SQL_STATS_LOG_CLEANUP = f"DELETE FROM \"{SCHEMA}\".stats_refresh_log WHERE finished_at < LOCALTIMESTAMP - INTERVAL '30 days'"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '100'))
+MAX_SEARCH_TERMS = 10
+
+RESUME_UPDATABLE_FIELDS = ('position', 'experience_years', 'education', 'desired_salary', 'summary')
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+
+BULK_IMPORT_PAGE_SIZE = 1000
+BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', '50000'))
+BULK_IMPORT_MAX_ERRORS = 1000
+# Верхняя граница колонок INTEGER в Postgres
+PG_INT_MAX = 2 ** 31 - 1
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson; charset=utf-8', 'csv': 'text/csv; charset=utf-8'}
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', '10000'))
+# Тело ответа функции ограничено по размеру: выгрузка останавливается на этом
+# объёме (UTF-8, до сжатия) и продолжается по X-Next-Cursor
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', str(3 * 1024 * 1024)))
+# Сколько строк серверный курсор отдаёт за один FETCH
+EXPORT_ITERSIZE = 2000
+# updated_at — время начала транзакции, поэтому долгая транзакция (bulk_import)
+# фиксирует строки «в прошлом». Выгружаются только строки старше этой задержки,
+# иначе курсор или updated_since проскочил бы их навсегда
+EXPORT_SETTLE_SECONDS = int(os.environ.get('EXPORT_SETTLE_SECONDS', '60'))
+
+# Поля вакансии, доступные через fields=, и их выражения в SELECT
+VACANCY_FIELDS = {
+    'id': 'v.id',
+    'title': 'v.title',
+    'description': 'v.description',
+    'salary_min': 'v.salary_min',
+    'salary_max': 'v.salary_max',
+    'location': 'v.location',
+    'employment_type': 'v.employment_type',
+    'experience_required': 'v.experience_required',
+    'is_active': 'v.is_active',
+    'company_id': 'v.company_id',
+    'company_name': 'c.name',
+    'company_rating': 'c.rating',
+    'created_at': 'v.created_at',
+    'updated_at': 'v.updated_at'
+}
+# Карточка в списках: без description, самой тяжёлой колонки
+VACANCY_LIST_FIELDS = (
+    'id', 'title', 'salary_min', 'salary_max', 'location', 'employment_type',
+    'experience_required', 'is_active', 'company_name', 'company_rating', 'created_at'
+)
+# id и created_at нужны для курсора, поэтому выбираются всегда
+VACANCY_REQUIRED_FIELDS = ('id', 'created_at')
+
+# Поля компании в выгрузке
+COMPANY_EXPORT_FIELDS = {
+    'id': 'c.id',
+    'name': 'c.name',
+    'description': 'c.description',
+    'rating': 'c.rating',
+    'reviews_count': 'c.reviews_count',
+    'website': 'c.website',
+    'vacancies_count': 'c.active_vacancies_count',
+    'created_at': 'c.created_at',
+    'updated_at': 'c.updated_at'
+}
+
+# Границы корзин зарплат для фасетов
+SALARY_BUCKETS = [0, 50000, 100000, 150000, 200000, 300000, 500000]
+
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+CACHEABLE_ACTIONS = {('vacancies', 'list'), ('vacancies', 'search'), ('vacancies', 'get'), ('companies', 'list')}
+
+STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', '300'))
+# После импорта витрина обновляется не чаще раза в столько секунд, остальное — по расписанию
+STATS_REFRESH_MIN_INTERVAL = int(os.environ.get('STATS_REFRESH_MIN_INTERVAL', '60'))
+STATS_DIMENSIONS = ('location', 'employment_type', 'title_keyword', 'company')
+STATS_DEFAULT_LIMIT = 50
+STATS_MAX_LIMIT = 500
+# Ключ pg_try_advisory_xact_lock: одно обновление витрины за раз на всю базу
+STATS_REFRESH_LOCK_ID = 25001
+
+MATCH_INDEX_TTL = int(os.environ.get('MATCH_INDEX_TTL', '600'))
+MATCH_WEIGHTS = {'skills': 0.6, 'salary': 0.25, 'experience': 0.15}
+
+# NUMERIC (рейтинг компаний) сразу приводится к float при чтении строк
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+
+# Пул соединений живёт между тёплыми вызовами функции
+_pool = []
+_pool_meta = {}
+_pool_lock = threading.Lock()
+_pool_stats = {'hits': 0, 'misses': 0, 'recycled': 0, 'discarded': 0, 'overflow': 0, 'replica_failures': 0}
+
+# Реестр подготовленных запросов: SQL -> (имя, текст с $1..$n, число параметров);
+# какие из них уже подготовлены, хранится в _pool_meta каждого соединения
+_prepared_sql = {}
+
+# Круговой выбор реплики и время, до которого недоступная реплика пропускается
+_replicas = {'next': 0, 'down_until': {}}
+_replicas_lock = threading.Lock()
+# Пользователи с недавними записями в этом процессе: user_id -> окно read-your-writes
+_recent_writers = OrderedDict()
+_recent_writers_lock = threading.Lock()
+
+# Индекс подбора: словарь навыков (название -> номер бита) и для каждой
+# активной вакансии [битовая маска навыков, salary_min, salary_max, experience_required]
+_match_index = {'skills': {}, 'vacancies': {}, 'max_id': 0, 'built_at': None}
+_match_lock = threading.Lock()
+
+# Кэш публичных списков: ключ (resource, action, параметры) -> готовый ответ с ETag
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+_response_cache_generation = {'vacancies': 0, 'companies': 0}
+# Время последнего сброса кэша ресурса (time.monotonic), см. cached_response
+_response_cache_invalidated_at = {'vacancies': 0.0, 'companies': 0.0}
+_response_cache_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+# Снимок витрины vacancy_market_stats, сгруппированный по измерениям
+_stats_cache = {'data': None, 'expires_at': 0.0}
+_stats_lock = threading.Lock()
+
+# Кэш проверенных токенов: sha256(token) -> claims до истечения exp
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0}
+
+# Отозванные токены: jti -> expires_at, синхронизируются с revoked_tokens
+# раз в REVOCATION_SYNC_INTERVAL секунд, а не на каждый запрос
+_revoked = {'tokens': {}, 'synced_at': None, 'last_revoked_at': None}
+_revoked_lock = threading.Lock()
+
+# Трассировка текущего запроса (время соединения, SQL, сериализация)
+_trace = threading.local()
+
+# Соединение batch-запроса: пока оно задано, get_db_connection отдаёт его
+# всем подзапросам, а release_db_connection не возвращает его в пул
+_batch = threading.local()
+
+# Маршрут текущего запроса: читать ли с реплики
+_route = threading.local()
+
 
 def handler(event: dict, context) -> dict:
     """
     API для управления вакансиями, резюме и компаниями.
     Поддерживает CRUD операции с проверкой авторизации.
     """
+    trace = start_trace()
+    try:
+        response = dispatch(event)
+    finally:
+        _trace.current = None
+    return finish_trace(trace, event, response)
+
+
+def dispatch(event: dict) -> dict:
+    """Разбор метода и параметров запроса, вызов обработчика"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization',
-                'Access-Control-Max-Age': '86400',
-                'Access-Control-Allow-Credentials': 'true'
-            },
+            'headers': PREFLIGHT_HEADERS,
             'body': '',
             'isBase64Encoded': False
         }
+    if event.get('warmup'):
+        return success_response(warm_up(), extra={'caches': get_cache_stats()})
+    if event.get('refresh_stats'):
+        return success_response(scheduled_stats_refresh())
     
     query_params = event.get('queryStringParameters') or {}
     resource = query_params.get('resource', '')
     action = query_params.get('action', 'list')
     
     try:
-        if resource == 'vacancies':
-            return handle_vacancies(event, action, method)
-        elif resource == 'resumes':
-            return handle_resumes(event, action, method)
-        elif resource == 'companies':
-            return handle_companies(event, action, method)
-        else:
-            return error_response('Invalid resource. Use ?resource=vacancies|resumes|companies', 400)
+        _route.replica = use_replica(event, resource, action)
+        # Клиент с недавней записью (возможно, в другом экземпляре) читает мимо кэша
+        if (method == 'GET' and (resource, action) in CACHEABLE_ACTIONS and RESPONSE_CACHE_TTL > 0
+                and not has_recent_write(event)):
+            return cached_response(event, resource, action, query_params)
+        response = route_request(event, resource, action, method)
+        if method in ('POST', 'PUT', 'DELETE') and resource != 'batch' and 200 <= response['statusCode'] < 300:
+            response = mark_write(event, response)
+        return compress_response(event, response)
     except Exception as e:
+        trace_error(e)
         return error_response(str(e), 500)
+    finally:
+        _route.replica = False
+
+
+def route_request(event: dict, resource: str, action: str, method: str) -> dict:
+    """Выбор обработчика ресурса"""
+    if resource == 'vacancies':
+        return handle_vacancies(event, action, method)
+    elif resource == 'resumes':
+        return handle_resumes(event, action, method)
+    elif resource == 'companies':
+        return handle_companies(event, action, method)
+    elif resource == 'me' and method == 'GET':
+        return handle_me(event)
+    elif resource == 'stats':
+        return handle_stats(event, action, method)
+    elif resource == 'batch' and method == 'POST':
+        return handle_batch(event)
+    else:
+        return error_response('Invalid resource. Use ?resource=vacancies|resumes|companies|me|stats|batch', 400)
+
+
+def get_header(event: dict, name: str) -> str:
+    """Заголовок запроса без учёта регистра"""
+    headers = event.get('headers') or {}
+    if name in headers:
+        return headers[name]
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return ''
+
+
+def _lru_get(cache: OrderedDict, key, now: float):
+    """Запись LRU-кэша, если она ещё не истекла"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry['expires_at'] <= now:
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry
+
+
+def _lru_put(cache: OrderedDict, key, entry: dict, max_entries: int):
+    """Запись в LRU-кэш с вытеснением самых старых ключей"""
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Сравнение ETag с If-None-Match (включая варианты ETag сжатых ответов)"""
+    if not if_none_match:
+        return False
+    digest = etag.strip('"')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/').strip('"').split('-')[0] == digest:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Выбор сжатия по Accept-Encoding: br (если доступен brotli), затем gzip"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _compress(body: str, encoding: str) -> str:
+    """Сжатое тело ответа в base64"""
+    raw = body.encode()
+    if encoding == 'br':
+        data = brotli.compress(raw, quality=5)
+    else:
+        import gzip
+        data = gzip.compress(raw, compresslevel=6, mtime=0)
+    return base64.b64encode(data).decode()
+
+
+def compress_response(event: dict, response: dict, entry: dict = None) -> dict:
+    """
+    Сжатие тела ответа по Accept-Encoding. Для записей кэша сжатые байты
+    сохраняются рядом с исходным телом и повторно не пересчитываются.
+    """
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded') or len(body) < COMPRESSION_MIN_BYTES:
+        return response
+    encoding = choose_encoding(get_header(event, 'Accept-Encoding'))
+    if not encoding:
+        return dict(response, headers={**response['headers'], 'Vary': 'Accept-Encoding'})
+    
+    if entry is not None:
+        encoded = entry.setdefault('encoded', {})
+        if encoding not in encoded:
+            encoded[encoding] = _compress(body, encoding)
+        compressed = encoded[encoding]
+    else:
+        compressed = _compress(body, encoding)
+    
+    headers = {**response['headers'], 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'}
+    if 'ETag' in headers:
+        headers['ETag'] = headers['ETag'][:-1] + f'-{encoding}"'
+    return dict(response, headers=headers, body=compressed, isBase64Encoded=True)
+
+
+def cached_response(event: dict, resource: str, action: str, query_params: dict) -> dict:
+    """Ответ публичного списка из кэша процесса с поддержкой ETag и 304"""
+    key = (resource, action, tuple(sorted(
+        (k, str(v).strip()) for k, v in query_params.items() if k not in ('resource', 'action')
+    )))
+    now = time.monotonic()
+    with _response_cache_lock:
+        entry = _lru_get(_response_cache, key, now)
+        generation = _response_cache_generation[resource]
+    
+    if entry is None:
+        _response_cache_stats['misses'] += 1
+        response = route_request(event, resource, action, 'GET')
+        if response['statusCode'] != 200:
+            return response
+        entry = {
+            'response': response,
+            'etag': '"' + hashlib.sha256(response['body'].encode()).hexdigest()[:32] + '"',
+            'expires_at': now + RESPONSE_CACHE_TTL
+        }
+        from_replica = getattr(_route, 'replica', False)
+        with _response_cache_lock:
+            # Не кэшируем ответ, если за время запроса данные ресурса менялись, а также
+            # ответ реплики сразу после записи: реплика могла её ещё не получить, и
+            # устаревшая страница из кэша досталась бы и самому автору записи
+            recently_written = time.monotonic() - _response_cache_invalidated_at[resource] < READ_YOUR_WRITES_WINDOW
+            if _response_cache_generation[resource] == generation and not (from_replica and recently_written):
+                _lru_put(_response_cache, key, entry, RESPONSE_CACHE_MAX_ENTRIES)
+    else:
+        _response_cache_stats['hits'] += 1
+    
+    cache_headers = {
+        'ETag': entry['etag'],
+        # Браузер всегда переспрашивает с If-None-Match: иначе автор записи ещё
+        # RESPONSE_CACHE_TTL секунд видел бы старый список, не доходя до сервера
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if _etag_matches(get_header(event, 'If-None-Match'), entry['etag']):
+        _response_cache_stats['not_modified'] += 1
+        encoding = None
+        if len(entry['response']['body']) >= COMPRESSION_MIN_BYTES:
+            encoding = choose_encoding(get_header(event, 'Accept-Encoding'))
+        if encoding:
+            cache_headers['ETag'] = entry['etag'][:-1] + f'-{encoding}"'
+        return {
+            'statusCode': 304,
+            'headers': {**NOT_MODIFIED_HEADERS, **cache_headers},
+            'body': '',
+            'isBase64Encoded': False
+        }
+    response = entry['response']
+    return compress_response(event, dict(response, headers={**response['headers'], **cache_headers}), entry)
+
+
+def invalidate_response_cache(*resources: str):
+    """Сброс кэша списков после изменения данных в этом процессе"""
+    with _response_cache_lock:
+        now = time.monotonic()
+        for resource in resources:
+            _response_cache_generation[resource] += 1
+            _response_cache_invalidated_at[resource] = now
+        for key in [k for k in _response_cache if k[0] in resources]:
+            del _response_cache[key]
+
+
+class TracingCursor(psycopg2.extensions.cursor):
+    """Курсор, записывающий длительность и число строк каждого SQL в трассировку запроса"""
+    
+    def execute(self, query, vars=None):
+        trace = getattr(_trace, 'current', None)
+        if trace is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(trace, query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+
+def start_trace() -> dict:
+    """Начало трассировки запроса в текущем потоке"""
+    trace = {
+        'started': time.perf_counter(), 'connect_ms': 0.0, 'db_ms': 0.0, 'serialize_ms': 0.0,
+        'query_count': 0, 'rows': 0, 'slow_queries': 0, 'queries': [], 'error': None
+    }
+    _trace.current = trace
+    return trace
+
+
+def trace_add(metric: str, ms: float):
+    """Добавление времени к метрике текущей трассировки"""
+    trace = getattr(_trace, 'current', None)
+    if trace is not None:
+        trace[metric] += ms
+
+
+def trace_error(error: Exception):
+    """Запись исключения, превращённого в ответ 500"""
+    trace = getattr(_trace, 'current', None)
+    if trace is not None:
+        trace['error'] = f'{type(error).__name__}: {str(error).strip()}'
+
+
+def record_query(trace: dict, query, ms: float, rowcount: int):
+    """Учёт выполненного SQL: суммарное время, строки, медленные запросы"""
+    trace['db_ms'] += ms
+    trace['query_count'] += 1
+    trace['rows'] += max(rowcount, 0)
+    if ms >= TRACE_SLOW_QUERY_MS:
+        trace['slow_queries'] += 1
+    if len(trace['queries']) < TRACE_MAX_QUERIES:
+        trace['queries'].append((query, ms, rowcount))
+
+
+def _sql_text(query) -> str:
+    """Текст SQL для лога в одну строку"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())[:TRACE_SQL_MAX_LENGTH]
+
+
+def finish_trace(trace: dict, event: dict, response: dict) -> dict:
+    """Завершение трассировки: заголовок Server-Timing и строка JSON-лога"""
+    total_ms = (time.perf_counter() - trace['started']) * 1000
+    if TRACE_SERVER_TIMING:
+        timing = (
+            f'connect;dur={trace["connect_ms"]:.1f}, '
+            f'db;dur={trace["db_ms"]:.1f};desc="{trace["query_count"]} queries", '
+            f'serialize;dur={trace["serialize_ms"]:.1f}, total;dur={total_ms:.1f}'
+        )
+        response = dict(response, headers={**response.get('headers', {}), 'Server-Timing': timing, 'Timing-Allow-Origin': '*'})
+    
+    sampled = random.random() < TRACE_SAMPLE_RATE
+    slow = total_ms >= TRACE_SLOW_REQUEST_MS or trace['slow_queries'] > 0
+    if sampled or slow or trace['error']:
+        query_params = event.get('queryStringParameters') or {}
+        print(json.dumps({
+            'type': 'trace',
+            'function': 'api',
+            'method': event.get('httpMethod', 'GET'),
+            'params': {k: v for k, v in query_params.items() if k in ('resource', 'action')},
+            'status': response.get('statusCode'),
+            'total_ms': round(total_ms, 2),
+            'connect_ms': round(trace['connect_ms'], 2),
+            'db_ms': round(trace['db_ms'], 2),
+            'serialize_ms': round(trace['serialize_ms'], 2),
+            'query_count': trace['query_count'],
+            'rows': trace['rows'],
+            'sampled': sampled,
+            'slow': slow,
+            'error': trace['error'],
+            # Накопленные счётчики кэшей процесса: по ним видно долю попаданий
+            'caches': get_cache_stats(),
+            'queries': [
+                {'sql': _sql_text(query), 'ms': round(ms, 2), 'rows': rowcount}
+                for query, ms, rowcount in trace['queries']
+            ]
+        }, ensure_ascii=False, default=str))
+    return response
+
+
+def has_recent_write(event: dict) -> bool:
+    """Клиент прислал X-Last-Write-At моложе READ_YOUR_WRITES_WINDOW"""
+    try:
+        last_write_at = float(get_header(event, 'X-Last-Write-At') or 0)
+    except ValueError:
+        return False
+    return time.time() - last_write_at < READ_YOUR_WRITES_WINDOW
+
+
+def use_replica(event: dict, resource: str, action: str) -> bool:
+    """Можно ли читать с реплики: действие только читает и у пользователя нет свежих записей"""
+    if not DATABASE_REPLICA_URLS or (resource, action) not in REPLICA_READ_ACTIONS:
+        return False
+    if has_recent_write(event):
+        return False
+    if _recent_writers and get_header(event, 'X-Authorization'):
+        user = get_user_from_request(event)
+        if user:
+            with _recent_writers_lock:
+                if _lru_get(_recent_writers, user['user_id'], time.monotonic()) is not None:
+                    return False
+    return True
+
+
+def mark_write(event: dict, response: dict) -> dict:
+    """Запоминание записи: следующие чтения пользователя идут на основную базу"""
+    user = get_user_from_request(event)
+    if user:
+        with _recent_writers_lock:
+            _lru_put(_recent_writers, user['user_id'],
+                     {'expires_at': time.monotonic() + READ_YOUR_WRITES_WINDOW}, RECENT_WRITERS_MAX_ENTRIES)
+    # Клиент возвращает заголовок, чтобы окно работало и в других экземплярах функции
+    return dict(response, headers={
+        **response['headers'],
+        'X-Last-Write-At': f'{time.time():.3f}',
+        'Access-Control-Expose-Headers': 'X-Last-Write-At'
+    })
+
+
+def _replica_candidates() -> list:
+    """Реплики в порядке кругового обхода, кроме недавно недоступных"""
+    now = time.monotonic()
+    with _replicas_lock:
+        start = _replicas['next']
+        _replicas['next'] = (start + 1) % len(DATABASE_REPLICA_URLS)
+        down_until = dict(_replicas['down_until'])
+    ordered = DATABASE_REPLICA_URLS[start:] + DATABASE_REPLICA_URLS[:start]
+    return [dsn for dsn in ordered if down_until.get(dsn, 0) <= now]
+
+
+def _mark_replica_down(dsn: str):
+    """Реплика пропускается REPLICA_RETRY_AFTER секунд"""
+    _pool_stats['replica_failures'] += 1
+    with _replicas_lock:
+        _replicas['down_until'][dsn] = time.monotonic() + REPLICA_RETRY_AFTER
+
+
+def _connect(dsn: str = None):
+    """Новое подключение к базе данных (по умолчанию к основной)"""
+    dsn = dsn or DATABASE_URL
+    options = {'connect_timeout': REPLICA_CONNECT_TIMEOUT} if dsn != DATABASE_URL else {}
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn, cursor_factory=TracingCursor, **options)
+    trace_add('connect_ms', (time.perf_counter() - started) * 1000)
+    psycopg2.extensions.register_type(DEC2FLOAT, conn)
+    now = time.monotonic()
+    _pool_meta[conn] = {'created_at': now, 'last_used': now, 'dsn': dsn}
+    return conn
+
+
+def _discard_connection(conn, reason: str = 'discarded'):
+    """Закрытие соединения без возврата в пул"""
+    _pool_meta.pop(conn, None)
+    _pool_stats[reason] += 1
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_connection_healthy(conn, meta: dict) -> bool:
+    """Проверка соединения перед выдачей из пула"""
+    if conn.closed:
+        return False
+    if time.monotonic() - meta['last_used'] < DB_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except Exception:
+        return False
 
 
 def get_db_connection():
-    """Подключение к базе данных"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    """Соединение для текущего запроса: с реплики для чтений, иначе с основной базы"""
+    batch_conn = getattr(_batch, 'conn', None)
+    if batch_conn is not None:
+        return batch_conn
+    if getattr(_route, 'replica', False):
+        for dsn in _replica_candidates():
+            try:
+                return _pooled_connection(dsn)
+            except psycopg2.OperationalError:
+                _mark_replica_down(dsn)
+    return _pooled_connection(DATABASE_URL)
 
 
-def verify_jwt_token(token: str) -> dict:
-    """Проверка JWT токена"""
+def _pooled_connection(dsn: str):
+    """Соединение с базой dsn из пула или новое подключение"""
+    while True:
+        with _pool_lock:
+            # Самое свежее свободное соединение с нужной базой
+            for index in range(len(_pool) - 1, -1, -1):
+                if _pool_meta.get(_pool[index], {}).get('dsn') == dsn:
+                    conn = _pool.pop(index)
+                    break
+            else:
+                _pool_stats['misses'] += 1
+                break
+        meta = _pool_meta.get(conn)
+        if meta is None or time.monotonic() - meta['created_at'] > DB_POOL_MAX_AGE:
+            _discard_connection(conn, 'recycled')
+            continue
+        if not _is_connection_healthy(conn, meta):
+            _discard_connection(conn)
+            continue
+        _pool_stats['hits'] += 1
+        return conn
+    return _connect(dsn)
+
+
+def release_db_connection(conn):
+    """Возврат соединения в пул (сломанные и старые соединения закрываются)"""
+    if conn is getattr(_batch, 'conn', None):
+        return
+    meta = _pool_meta.get(conn)
+    if meta is None or conn.closed:
+        if meta is not None and meta['dsn'] != DATABASE_URL:
+            _mark_replica_down(meta['dsn'])
+        _discard_connection(conn)
+        return
     try:
-        secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-        return jwt.decode(token, secret, algorithms=['HS256'])
-    except:
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Exception:
+        _discard_connection(conn)
+        return
+    now = time.monotonic()
+    if now - meta['created_at'] > DB_POOL_MAX_AGE:
+        _discard_connection(conn, 'recycled')
+        return
+    meta['last_used'] = now
+    with _pool_lock:
+        if len(_pool) < DB_POOL_MAX_SIZE:
+            _pool.append(conn)
+            return
+    _discard_connection(conn, 'overflow')
+
+
+def warm_up() -> dict:
+    """Прогрев до первого запроса: соединение в пул и множество отозванных токенов"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+    finally:
+        release_db_connection(conn)
+    with _revoked_lock:
+        _sync_revoked_tokens()
+    return get_pool_stats()
+
+
+def _numbered_sql(sql: str) -> tuple:
+    """Текст для PREPARE: %s -> $1..$n, %% -> %"""
+    parts = sql.replace('%%', '\0').split('%s')
+    text = parts[0] + ''.join(f'${number}{part}' for number, part in enumerate(parts[1:], start=1))
+    return text.replace('\0', '%'), len(parts) - 1
+
+
+def execute_prepared(cur, sql: str, params=(), retry: bool = True):
+    """
+    Выполнение запроса через EXECUTE: PREPARE при первом использовании на
+    соединении, повторная подготовка после сброса сессии или миграции
+    """
+    conn = cur.connection
+    meta = _pool_meta.get(conn)
+    if not PREPARED_STATEMENTS or meta is None:
+        return cur.execute(sql, params)
+    statement = _prepared_sql.get(sql)
+    if statement is None:
+        if len(_prepared_sql) >= PREPARED_MAX_STATEMENTS:
+            return cur.execute(sql, params)
+        text, count = _numbered_sql(sql)
+        statement = _prepared_sql[sql] = ('stmt_' + hashlib.sha1(sql.encode()).hexdigest()[:16], text, count)
+    
+    name, text, count = statement
+    prepared = meta.setdefault('prepared', set())
+    if name not in prepared and len(prepared) >= PREPARED_MAX_PER_CONNECTION:
+        return cur.execute(sql, params)
+    # Повтор безопасен, только если ошибка не оборвёт уже начатую транзакцию
+    idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        if name not in prepared:
+            cur.execute(f'PREPARE {name} AS {text}')
+            prepared.add(name)
+        return cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f'EXECUTE {name}', params)
+    except psycopg2.Error as e:
+        if e.pgcode not in PREPARED_RETRY_CODES:
+            raise
+        if not (retry and idle):
+            # Посреди транзакции чинить нельзя: соединение закроется при возврате в пул
+            _pool_meta.pop(conn, None)
+            raise
+        conn.rollback()
+        cur.execute('DEALLOCATE ALL')
+        prepared.clear()
+        return execute_prepared(cur, sql, params, retry=False)
+
+
+def get_pool_stats() -> dict:
+    """Счётчики пула соединений"""
+    with _pool_lock:
+        return dict(_pool_stats, idle=len(_pool), open=len(_pool_meta))
+
+
+def get_cache_stats() -> dict:
+    """Счётчики попаданий в кэши процесса"""
+    return {
+        'responses': dict(_response_cache_stats, size=len(_response_cache)),
+        'tokens': dict(_token_cache_stats, size=len(_token_cache))
+    }
+
+
+def verify_jwt_token(token: str) -> dict:
+    """Проверка JWT токена (с кэшем уже проверенных токенов)"""
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    with _token_cache_lock:
+        entry = _lru_get(_token_cache, key, now)
+    if entry is not None:
+        _token_cache_stats['hits'] += 1
+        claims = entry['claims']
+    else:
+        _token_cache_stats['misses'] += 1
+        import jwt
+        try:
+            claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        except:
+            return None
+        
+        expires_at = claims.get('exp', now + TOKEN_CACHE_TTL)
+        with _token_cache_lock:
+            _lru_put(_token_cache, key, {'claims': claims, 'expires_at': expires_at}, TOKEN_CACHE_MAX_ENTRIES)
+    
+    if claims.get('jti') and is_token_revoked(claims['jti']):
         return None
+    return claims
+
+
+def _sync_revoked_tokens():
+    """Подгрузка отозванных токенов из БД (полная при первом вызове, затем только новые)"""
+    now = datetime.utcnow()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            if _revoked['last_revoked_at'] is None:
+                cur.execute(SQL_REVOKED_ACTIVE, (now,))
+            else:
+                # Перекрытие окна ловит строки, закоммиченные позже своего revoked_at
+                cur.execute(SQL_REVOKED_SINCE, (_revoked['last_revoked_at'] - timedelta(seconds=60),))
+            rows = cur.fetchall()
+    finally:
+        release_db_connection(conn)
+    
+    tokens = _revoked['tokens']
+    for token_id, expires_at, revoked_at in rows:
+        tokens[token_id] = expires_at
+        if _revoked['last_revoked_at'] is None or revoked_at > _revoked['last_revoked_at']:
+            _revoked['last_revoked_at'] = revoked_at
+    if _revoked['last_revoked_at'] is None:
+        _revoked['last_revoked_at'] = now
+    for token_id in [t for t, expires_at in tokens.items() if expires_at <= now]:
+        del tokens[token_id]
+    _revoked['synced_at'] = time.monotonic()
+
+
+def is_token_revoked(token_id: str) -> bool:
+    """Проверка отзыва токена по множеству в памяти процесса"""
+    with _revoked_lock:
+        if _revoked['synced_at'] is None or time.monotonic() - _revoked['synced_at'] > REVOCATION_SYNC_INTERVAL:
+            _sync_revoked_tokens()
+        return token_id in _revoked['tokens']
 
 
 def get_user_from_request(event: dict) -> dict:
@@ -68,52 +977,462 @@ def get_user_from_request(event: dict) -> dict:
     return verify_jwt_token(token)
 
 
+def fetch_dicts(cur) -> list:
+    """Строки результата как словари по именам колонок cursor.description"""
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def fetch_dict(cur) -> dict:
+    """Одна строка результата как словарь (или None)"""
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cur.description], row))
+
+
+def _json_default(value):
+    """Типы БД, которые не сериализует json/orjson сам"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data) -> str:
+    """JSON-сериализация: orjson, если установлен, иначе стандартный json"""
+    started = time.perf_counter()
+    if orjson is not None:
+        result = orjson.dumps(data, default=_json_default).decode()
+    else:
+        result = json.dumps(data, default=_json_default, ensure_ascii=False)
+    trace_add('serialize_ms', (time.perf_counter() - started) * 1000)
+    return result
+
+
+def parse_pagination(query_params: dict, sort_type: str = 'timestamp') -> tuple:
+    """Разбор limit/offset/cursor с ограничением размера страницы"""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+        offset = int(query_params.get('offset', 0))
+    except (TypeError, ValueError):
+        raise ValueError('limit and offset must be integers')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    cursor = decode_cursor(query_params['cursor'], sort_type) if query_params.get('cursor') else None
+    return limit, offset, cursor
+
+
+def encode_cursor(*values) -> str:
+    """Непрозрачный курсор из ключа сортировки последней строки"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_type: str = 'timestamp') -> list:
+    """Разбор курсора, полученного от клиента; sort_type — 'timestamp' или 'number'"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('Invalid cursor')
+    # Значения остаются строками: тип им задаёт колонка, с которой их сравнивают,
+    # поэтому здесь только проверяется, что Postgres сможет их разобрать
+    sort_key, row_id = values
+    if not isinstance(sort_key, str) or not isinstance(row_id, str) or not row_id.isdigit():
+        raise ValueError('Invalid cursor')
+    if sort_type == 'number':
+        valid = re.fullmatch(r'-?\d+(\.\d+)?(e[-+]?\d+)?', sort_key, re.IGNORECASE) is not None
+    else:
+        try:
+            datetime.fromisoformat(sort_key)
+            valid = True
+        except ValueError:
+            valid = False
+    if not valid:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def vacancy_columns(query_params: dict, default_fields: tuple = VACANCY_LIST_FIELDS) -> str:
+    """Список колонок SELECT по параметру fields= (только из VACANCY_FIELDS)"""
+    requested = _split_param(query_params.get('fields', ''))
+    unknown = [field for field in requested if field not in VACANCY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(VACANCY_FIELDS)}")
+    fields = list(VACANCY_REQUIRED_FIELDS)
+    fields += [field for field in (requested or default_fields) if field not in fields]
+    return select_list(VACANCY_FIELDS, fields)
+
+
+def select_list(expressions: dict, fields) -> str:
+    """Колонки SELECT по словарю поле → выражение; псевдоним, только если имя отличается"""
+    return ', '.join(
+        expressions[field] if expressions[field].endswith(f'.{field}') else f'{expressions[field]} AS {field}'
+        for field in fields
+    )
+
+
+def build_search_tsquery(text: str) -> str:
+    """Запрос to_tsquery из пользовательского ввода; последнее слово ищется по префиксу"""
+    words = re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+    if not words:
+        return ''
+    words[-1] += ':*'
+    return ' & '.join(words)
+
+
+def _split_param(value: str) -> list:
+    """Значения фильтра через запятую"""
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+def build_vacancy_filters(query_params: dict) -> tuple:
+    """Условия WHERE для фильтров списка вакансий"""
+    clauses = []
+    params = []
+    try:
+        if query_params.get('salary_from'):
+            clauses.append('COALESCE(v.salary_max, v.salary_min) >= %s')
+            params.append(int(query_params['salary_from']))
+        if query_params.get('salary_to'):
+            clauses.append('COALESCE(v.salary_min, v.salary_max) <= %s')
+            params.append(int(query_params['salary_to']))
+        if query_params.get('experience_max'):
+            clauses.append('v.experience_required <= %s')
+            params.append(int(query_params['experience_max']))
+    except ValueError:
+        raise ValueError('salary_from, salary_to and experience_max must be integers')
+    if query_params.get('location'):
+        clauses.append('v.location = ANY(%s)')
+        params.append(_split_param(query_params['location']))
+    if query_params.get('employment_type'):
+        clauses.append('v.employment_type = ANY(%s)')
+        params.append(_split_param(query_params['employment_type']))
+    sql = ''.join(f' AND {clause}' for clause in clauses)
+    return sql, params
+
+
+def fetch_vacancy_facets(cur, schema: str, filter_sql: str, filter_params: list) -> dict:
+    """Количество вакансий по городам, типам занятости и корзинам зарплат за один запрос"""
+    cur.execute(
+        f"""
+        SELECT location, employment_type, salary_bucket,
+               GROUPING(location), GROUPING(employment_type), GROUPING(salary_bucket),
+               COUNT(*)
+        FROM (
+            SELECT v.location, v.employment_type,
+                   width_bucket(COALESCE(v.salary_max, v.salary_min), %s::int[]) AS salary_bucket
+            FROM "{schema}".vacancies v
+            WHERE v.is_active = TRUE {filter_sql}
+        ) f
+        GROUP BY GROUPING SETS ((location), (employment_type), (salary_bucket), ())
+        """,
+        [SALARY_BUCKETS] + filter_params
+    )
+    facets = {'total': 0, 'location': [], 'employment_type': [], 'salary': []}
+    for location, employment_type, bucket, g_location, g_employment, g_salary, count in cur.fetchall():
+        if not g_location:
+            facets['location'].append({'value': location, 'count': count})
+        elif not g_employment:
+            facets['employment_type'].append({'value': employment_type, 'count': count})
+        elif not g_salary:
+            if bucket is None:
+                continue
+            facets['salary'].append({
+                'from': SALARY_BUCKETS[bucket - 1] if bucket > 0 else None,
+                'to': SALARY_BUCKETS[bucket] if bucket < len(SALARY_BUCKETS) else None,
+                'count': count
+            })
+        else:
+            facets['total'] = count
+    return facets
+
+
+def _load_skill_bits(cur, skills: dict, min_id: int = 0) -> dict:
+    """Битовые маски навыков вакансий по полнотекстовому индексу за один запрос"""
+    if not skills:
+        return {}
+    cur.execute(SQL_MATCH_SKILL_BITS, (list(skills.keys()), list(skills.values()), min_id))
+    bits = {}
+    for vacancy_id, bit in cur.fetchall():
+        bits[vacancy_id] = bits.get(vacancy_id, 0) | (1 << bit)
+    return bits
+
+
+def _load_match_vacancies(cur, min_id: int = 0) -> dict:
+    """Числовые признаки активных вакансий с id больше min_id"""
+    cur.execute(SQL_MATCH_VACANCIES, (min_id,))
+    return {row[0]: [0, row[1], row[2], row[3] or 0] for row in cur.fetchall()}
+
+
+def refresh_match_index(cur, skill_names: list) -> dict:
+    """
+    Актуализация индекса подбора: полная пересборка раз в MATCH_INDEX_TTL,
+    между пересборками догружаются только новые вакансии и новые навыки.
+    Словари индекса не меняются на месте, а заменяются новыми, поэтому
+    возвращаемый снимок можно обходить без блокировки.
+    """
+    with _match_lock:
+        index = _match_index
+        if index['built_at'] is None or time.monotonic() - index['built_at'] > MATCH_INDEX_TTL:
+            cur.execute(SQL_MATCH_SKILL_NAMES)
+            names = {row[0] for row in cur.fetchall()} | set(skill_names)
+            skills = {name: bit for bit, name in enumerate(sorted(names))}
+            vacancies = _load_match_vacancies(cur)
+            for vacancy_id, bits in _load_skill_bits(cur, skills).items():
+                if vacancy_id in vacancies:
+                    vacancies[vacancy_id][0] = bits
+            index.update({
+                'skills': skills,
+                'vacancies': vacancies,
+                'max_id': max(vacancies, default=0),
+                'built_at': time.monotonic()
+            })
+            return dict(index)
+        
+        skills, vacancies = index['skills'], index['vacancies']
+        new_skills = {}
+        for name in skill_names:
+            if name not in skills and name not in new_skills:
+                new_skills[name] = len(skills) + len(new_skills)
+        if new_skills:
+            skills = {**skills, **new_skills}
+            added_bits = _load_skill_bits(cur, new_skills)
+            if added_bits:
+                vacancies = dict(vacancies)
+                for vacancy_id, bits in added_bits.items():
+                    if vacancy_id in vacancies:
+                        entry = vacancies[vacancy_id]
+                        vacancies[vacancy_id] = [entry[0] | bits] + entry[1:]
+        
+        new_vacancies = _load_match_vacancies(cur, index['max_id'])
+        if new_vacancies:
+            for vacancy_id, bits in _load_skill_bits(cur, skills, index['max_id']).items():
+                if vacancy_id in new_vacancies:
+                    new_vacancies[vacancy_id][0] = bits
+            vacancies = {**vacancies, **new_vacancies}
+            index['max_id'] = max(new_vacancies)
+        index.update(skills=skills, vacancies=vacancies)
+        return dict(index)
+
+
+def _salary_fit(desired_salary, salary_min, salary_max) -> float:
+    """Насколько ожидания кандидата укладываются в вилку вакансии"""
+    upper = salary_max or salary_min
+    if not desired_salary or not upper:
+        return 0.5
+    if desired_salary <= upper:
+        return 1.0
+    return max(0.0, 1.0 - (desired_salary - upper) / desired_salary)
+
+
+def _experience_fit(experience_years, experience_required) -> float:
+    """Доля требуемого опыта, которой обладает кандидат"""
+    if not experience_required:
+        return 1.0
+    return min(1.0, (experience_years or 0) / experience_required)
+
+
+def rank_vacancies_for_resume(index: dict, resume: dict, limit: int) -> list:
+    """Top-k вакансий для резюме через кучу, без сортировки всего индекса"""
+    skills = index['skills']
+    resume_bits = 0
+    for skill in resume['skills']:
+        name = (skill.get('name') or '').lower()
+        if name in skills:
+            resume_bits |= 1 << skills[name]
+    
+    desired_salary = resume.get('desired_salary')
+    experience_years = resume.get('experience_years')
+    
+    def scored():
+        for vacancy_id, (bits, salary_min, salary_max, experience_required) in index['vacancies'].items():
+            vacancy_skills = bits.bit_count()
+            skill_score = (bits & resume_bits).bit_count() / vacancy_skills if vacancy_skills else 0.0
+            score = (
+                MATCH_WEIGHTS['skills'] * skill_score +
+                MATCH_WEIGHTS['salary'] * _salary_fit(desired_salary, salary_min, salary_max) +
+                MATCH_WEIGHTS['experience'] * _experience_fit(experience_years, experience_required)
+            )
+            yield score, vacancy_id
+    
+    return heapq.nlargest(limit, scored())
+
+
 def handle_vacancies(event: dict, action: str, method: str) -> dict:
     """Управление вакансиями"""
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    schema = SCHEMA
     
     if action == 'list' and method == 'GET':
         query_params = event.get('queryStringParameters') or {}
-        limit = int(query_params.get('limit', 20))
-        offset = int(query_params.get('offset', 0))
+        try:
+            limit, offset, cursor = parse_pagination(query_params)
+            filter_sql, filter_params = build_vacancy_filters(query_params)
+            columns = vacancy_columns(query_params)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        params = list(filter_params)
+        if cursor:
+            keyset_sql = 'AND (v.created_at, v.id) < (%s, %s)'
+            params += [cursor[0], cursor[1], limit, 0]
+        else:
+            keyset_sql = ''
+            params += [limit, offset]
+        
+        sql = f"""
+            SELECT {columns}
+            FROM "{schema}".vacancies v
+            JOIN "{schema}".companies c ON v.company_id = c.id
+            WHERE v.is_active = TRUE {filter_sql} {keyset_sql}
+            ORDER BY v.created_at DESC, v.id DESC
+            LIMIT %s OFFSET %s
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                # План с фильтрами зависит от их значений, общий план подготовленного
+                # запроса для них хуже, поэтому готовится только лента без фильтров.
+                # С fields= текст запроса задаёт клиент: такие запросы не готовятся,
+                # чтобы перестановки полей не занимали реестр и слоты соединения
+                if filter_sql or query_params.get('fields'):
+                    cur.execute(sql, params)
+                else:
+                    execute_prepared(cur, sql, params)
+                vacancies = fetch_dicts(cur)
+                
+                extra = {'next_cursor': encode_cursor(vacancies[-1]['created_at'], vacancies[-1]['id']) if len(vacancies) == limit else None}
+                if query_params.get('facets') in ('1', 'true'):
+                    extra['facets'] = fetch_vacancy_facets(cur, schema, filter_sql, filter_params)
+                return success_response(vacancies, extra=extra)
+        finally:
+            release_db_connection(conn)
+    
+    elif action == 'search' and method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        tsquery = build_search_tsquery(query_params.get('q', ''))
+        if not tsquery:
+            return error_response('Search query q is required', 400)
+        try:
+            limit, offset, cursor = parse_pagination(query_params, 'number')
+            filter_sql, filter_params = build_vacancy_filters(query_params)
+            columns = vacancy_columns(query_params)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        params = [tsquery, tsquery] + filter_params
+        if cursor:
+            keyset_sql = 'AND (ts_rank(v.search_vector, q.query), v.id) < (%s::real, %s)'
+            params += [cursor[0], cursor[1], limit, 0]
+        else:
+            keyset_sql = ''
+            params += [limit, offset]
         
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute(
                     f"""
-                    SELECT v.id, v.title, v.description, v.salary_min, v.salary_max, 
-                           v.location, v.employment_type, v.experience_required, v.is_active,
-                           c.name as company_name, c.rating
-                    FROM "{schema}".vacancies v
+                    SELECT {columns},
+                           ts_rank(v.search_vector, q.query) AS rank
+                    FROM (SELECT to_tsquery('russian', %s) || to_tsquery('english', %s) AS query) q,
+                         "{schema}".vacancies v
                     JOIN "{schema}".companies c ON v.company_id = c.id
-                    WHERE v.is_active = TRUE
-                    ORDER BY v.created_at DESC
+                    WHERE v.is_active = TRUE AND v.search_vector @@ q.query {filter_sql} {keyset_sql}
+                    ORDER BY rank DESC, v.id DESC
                     LIMIT %s OFFSET %s
                     """,
-                    (limit, offset)
+                    params
+                )
+                vacancies = fetch_dicts(cur)
+                
+                next_cursor = encode_cursor(vacancies[-1]['rank'], vacancies[-1]['id']) if len(vacancies) == limit else None
+                return success_response(vacancies, extra={'next_cursor': next_cursor})
+        finally:
+            release_db_connection(conn)
+    
+    elif action == 'get' and method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        vacancy_id = query_params.get('id', '')
+        if not vacancy_id.isdigit():
+            return error_response('id must be an integer', 400)
+        try:
+            columns = vacancy_columns(query_params, tuple(VACANCY_FIELDS))
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT {columns}
+                    FROM "{schema}".vacancies v
+                    JOIN "{schema}".companies c ON v.company_id = c.id
+                    WHERE v.id = %s
+                    """,
+                    (int(vacancy_id),)
+                )
+                vacancy = fetch_dict(cur)
+                if not vacancy:
+                    return error_response('Vacancy not found', 404)
+                return success_response(vacancy)
+        finally:
+            release_db_connection(conn)
+    
+    elif action == 'export' and method == 'GET':
+        return export_rows(event, 'vacancies')
+    
+    elif action == 'recommended' and method == 'GET':
+        user = get_user_from_request(event)
+        if not user:
+            return error_response('Unauthorized', 401)
+        
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            limit, _, _ = parse_pagination(query_params)
+            columns = vacancy_columns(query_params)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                resume = fetch_latest_resume(cur, user['user_id'])
+                if not resume:
+                    return success_response([])
+                
+                skill_names = [s['name'].lower() for s in resume['skills'] if s.get('name')]
+                index = refresh_match_index(cur, skill_names)
+                top = rank_vacancies_for_resume(index, resume, limit)
+                if not top:
+                    return success_response([])
+                
+                cur.execute(
+                    f"""
+                    SELECT {columns}
+                    FROM "{schema}".vacancies v
+                    JOIN "{schema}".companies c ON v.company_id = c.id
+                    WHERE v.id = ANY(%s) AND v.is_active = TRUE
+                    """,
+                    ([vacancy_id for _, vacancy_id in top],)
                 )
-                rows = cur.fetchall()
+                found = {vacancy['id']: vacancy for vacancy in fetch_dicts(cur)}
                 
                 vacancies = []
-                for row in rows:
-                    vacancies.append({
-                        'id': row[0],
-                        'title': row[1],
-                        'description': row[2],
-                        'salary_min': row[3],
-                        'salary_max': row[4],
-                        'location': row[5],
-                        'employment_type': row[6],
-                        'experience_required': row[7],
-                        'is_active': row[8],
-                        'company_name': row[9],
-                        'company_rating': float(row[10]) if row[10] else 0.0
-                    })
+                for score, vacancy_id in top:
+                    if vacancy_id in found:
+                        vacancy = found[vacancy_id]
+                        vacancy['match_score'] = round(score, 4)
+                        vacancies.append(vacancy)
                 
                 return success_response(vacancies)
         finally:
-            conn.close()
+            release_db_connection(conn)
     
     elif action == 'create' and method == 'POST':
         user = get_user_from_request(event)
@@ -126,12 +1445,7 @@ def handle_vacancies(event: dict, action: str, method: str) -> dict:
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    f"""
-                    INSERT INTO "{schema}".vacancies 
-                    (company_id, title, description, salary_min, salary_max, location, employment_type, experience_required)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                    """,
+                    SQL_VACANCY_INSERT,
                     (
                         body.get('company_id'),
                         body.get('title'),
@@ -145,17 +1459,374 @@ def handle_vacancies(event: dict, action: str, method: str) -> dict:
                 )
                 vacancy_id = cur.fetchone()[0]
                 conn.commit()
+                invalidate_response_cache('vacancies', 'companies')
                 
                 return success_response({'id': vacancy_id, 'message': 'Vacancy created'}, 201)
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    elif action == 'bulk_import' and method == 'POST':
+        user = get_user_from_request(event)
+        if not user or user.get('role') not in ['admin', 'employer']:
+            return error_response('Unauthorized', 401)
+        
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                result = import_vacancies(cur, iter_import_rows(body))
+                conn.commit()
+                invalidate_response_cache('vacancies', 'companies')
+            if result['inserted'] or result['updated']:
+                result['stats'] = refresh_stats_after_import(conn)
+            return success_response(result)
+        except ValueError as e:
+            conn.rollback()
+            return error_response(str(e), 400)
+        finally:
+            release_db_connection(conn)
     
     return error_response('Invalid action or method', 400)
 
 
+def _iter_json_array(text: str):
+    """Поэлементный разбор JSON-массива без построения всего списка"""
+    decoder = json.JSONDecoder()
+    pos = text.index('[') + 1
+    length = len(text)
+    while True:
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos >= length:
+            raise ValueError('Unterminated JSON array')
+        if text[pos] == ']':
+            return
+        item, pos = decoder.raw_decode(text, pos)
+        yield item
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos < length and text[pos] == ',':
+            pos += 1
+        elif pos >= length or text[pos] != ']':
+            raise ValueError('Malformed JSON array')
+
+
+def iter_import_rows(body: str):
+    """Строки импорта (номер, объект) из JSON-массива или NDJSON"""
+    if body.lstrip().startswith('['):
+        try:
+            yield from enumerate(_iter_json_array(body), 1)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Malformed JSON array: {e}')
+        return
+    for number, line in enumerate(body.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def _optional_int(row: dict, field: str, default=None):
+    """Целое неотрицательное поле строки импорта в пределах колонки INTEGER"""
+    value = row.get(field, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= PG_INT_MAX:
+        raise ValueError(f'{field} must be an integer from 0 to {PG_INT_MAX}')
+    return value
+
+
+def _optional_str(row: dict, field: str, max_length: int, default=None):
+    """Строковое поле строки импорта с ограничением длины"""
+    value = row.get(field, default)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    if len(value) > max_length:
+        raise ValueError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def validate_import_row(row) -> tuple:
+    """Проверка строки импорта; возвращает значения для INSERT"""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be a JSON object')
+    company_id = row.get('company_id')
+    if isinstance(company_id, bool) or not isinstance(company_id, int) or not 0 < company_id <= PG_INT_MAX:
+        raise ValueError('company_id must be a positive integer')
+    title = _optional_str(row, 'title', 255)
+    if not title or not title.strip():
+        raise ValueError('title is required')
+    salary_min = _optional_int(row, 'salary_min')
+    salary_max = _optional_int(row, 'salary_max')
+    if salary_min is not None and salary_max is not None and salary_min > salary_max:
+        raise ValueError('salary_min must not exceed salary_max')
+    is_active = row.get('is_active', True)
+    if not isinstance(is_active, bool):
+        raise ValueError('is_active must be a boolean')
+    if isinstance(row.get('external_id'), int) and not isinstance(row['external_id'], bool):
+        row['external_id'] = str(row['external_id'])
+    return (
+        _optional_str(row, 'external_id', 255),
+        company_id,
+        title,
+        _optional_str(row, 'description', 1_000_000),
+        salary_min,
+        salary_max,
+        _optional_str(row, 'location', 255),
+        _optional_str(row, 'employment_type', 50, 'full_time'),
+        _optional_int(row, 'experience_required', 0),
+        is_active
+    )
+
+
+def _import_page(cur, page: list, result: dict):
+    """Загрузка страницы проверенных строк одним INSERT ... ON CONFLICT"""
+    cur.execute(SQL_IMPORT_COMPANY_IDS, (list({values[1] for _, values in page}),))
+    known_companies = {row[0] for row in cur.fetchall()}
+    
+    # Повтор external_id внутри одной страницы ломает ON CONFLICT DO UPDATE
+    unique_rows = {}
+    for number, values in page:
+        if values[1] not in known_companies:
+            _import_error(result, number, f'Company {values[1]} does not exist')
+            continue
+        key = (values[1], values[0]) if values[0] is not None else ('row', number)
+        if key in unique_rows:
+            _import_error(result, unique_rows[key][0], f'Superseded by row {number} with the same external_id')
+        unique_rows[key] = (number, values)
+    if not unique_rows:
+        return
+    
+    import psycopg2.extras
+    inserted_flags = psycopg2.extras.execute_values(
+        cur,
+        SQL_IMPORT_UPSERT,
+        [values for _, values in unique_rows.values()],
+        page_size=BULK_IMPORT_PAGE_SIZE,
+        fetch=True
+    )
+    for (inserted,) in inserted_flags:
+        result['inserted' if inserted else 'updated'] += 1
+
+
+def _import_error(result: dict, number: int, message: str):
+    """Учёт ошибки строки импорта"""
+    result['failed'] += 1
+    if len(result['errors']) < BULK_IMPORT_MAX_ERRORS:
+        result['errors'].append({'row': number, 'error': message})
+
+
+def import_vacancies(cur, rows) -> dict:
+    """Потоковая проверка и загрузка вакансий страницами в текущей транзакции"""
+    result = {'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    page = []
+    total = 0
+    for number, row in rows:
+        total += 1
+        if total > BULK_IMPORT_MAX_ROWS:
+            raise ValueError(f'At most {BULK_IMPORT_MAX_ROWS} rows per import')
+        if row is None:
+            _import_error(result, number, 'Invalid JSON')
+            continue
+        try:
+            page.append((number, validate_import_row(row)))
+        except ValueError as e:
+            _import_error(result, number, str(e))
+            continue
+        if len(page) >= BULK_IMPORT_PAGE_SIZE:
+            _import_page(cur, page, result)
+            page = []
+    if page:
+        _import_page(cur, page, result)
+    return result
+
+
+def parse_export_params(query_params: dict) -> tuple:
+    """Разбор format/limit/updated_since/cursor выгрузки"""
+    export_format = query_params.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        limit = int(query_params.get('limit', EXPORT_MAX_ROWS))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    limit = max(1, min(limit, EXPORT_MAX_ROWS))
+    updated_since = None
+    if query_params.get('updated_since'):
+        try:
+            updated_since = datetime.fromisoformat(query_params['updated_since'])
+        except ValueError:
+            raise ValueError('updated_since must be an ISO 8601 timestamp')
+    cursor = decode_cursor(query_params['cursor']) if query_params.get('cursor') else None
+    return export_format, limit, updated_since, cursor
+
+
+def _export_sql(resource: str, where_sql: str) -> tuple:
+    """Запрос выгрузки ресурса и список выгружаемых полей"""
+    schema = SCHEMA
+    if resource == 'vacancies':
+        fields = list(VACANCY_FIELDS)
+        return fields, f"""
+            SELECT {select_list(VACANCY_FIELDS, fields)}
+            FROM "{schema}".vacancies v
+            JOIN "{schema}".companies c ON v.company_id = c.id
+            WHERE TRUE {where_sql}
+            ORDER BY v.updated_at, v.id
+            LIMIT %s
+        """
+    fields = list(COMPANY_EXPORT_FIELDS)
+    return fields, f"""
+        SELECT {select_list(COMPANY_EXPORT_FIELDS, fields)}
+        FROM "{schema}".companies c
+        WHERE TRUE {where_sql}
+        ORDER BY c.updated_at, c.id
+        LIMIT %s
+    """
+
+
+def _csv_value(value):
+    """Значение ячейки CSV: даты в ISO 8601, NULL — пустая строка"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def iter_export_lines(cur, fields: list, export_format: str):
+    """
+    Пары (строка результата, строка выгрузки): в памяти только текущая
+    порция серверного курсора. Заголовок CSV идёт с row = None.
+    """
+    if export_format == 'csv':
+        import csv
+        import io
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        
+        def encode(values):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(values)
+            return buffer.getvalue()
+        
+        yield None, encode(fields)
+        for row in cur:
+            yield row, encode([_csv_value(value) for value in row])
+    else:
+        for row in cur:
+            yield row, dumps(dict(zip(fields, row))) + '\n'
+
+
+def export_rows(event: dict, resource: str) -> dict:
+    """
+    Выгрузка вакансий или компаний в NDJSON/CSV для синхронизации внешних систем.
+    Строки читаются серверным курсором порциями по EXPORT_ITERSIZE в порядке
+    (updated_at, id); updated_since отбирает изменённые после момента, а
+    X-Next-Cursor продолжает выгрузку, если строк больше limit или тело
+    достигло EXPORT_MAX_BYTES. Строки,
+    изменённые позже EXPORT_SETTLE_SECONDS назад, попадут в следующую выгрузку.
+    """
+    query_params = event.get('queryStringParameters') or {}
+    try:
+        export_format, limit, updated_since, cursor = parse_export_params(query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    alias = 'v' if resource == 'vacancies' else 'c'
+    where_sql = f" AND {alias}.updated_at < LOCALTIMESTAMP - %s * INTERVAL '1 second'"
+    params = [EXPORT_SETTLE_SECONDS]
+    if updated_since:
+        where_sql += f' AND {alias}.updated_at >= %s'
+        params.append(updated_since)
+    if cursor:
+        where_sql += f' AND ({alias}.updated_at, {alias}.id) > (%s, %s)'
+        params += [cursor[0], cursor[1]]
+    fields, sql = _export_sql(resource, where_sql)
+    params.append(limit)
+    
+    parts, size, rows, last, truncated = [], 0, 0, None, False
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name=f'export_{resource}') as cur:
+            cur.itersize = EXPORT_ITERSIZE
+            cur.execute(sql, params)
+            for row, line in iter_export_lines(cur, fields, export_format):
+                length = len(line.encode())
+                # Хотя бы одна строка попадает в ответ, иначе курсор не сдвинется
+                if row is not None and rows and size + length > EXPORT_MAX_BYTES:
+                    truncated = True
+                    break
+                parts.append(line)
+                size += length
+                if row is not None:
+                    rows += 1
+                    last = row
+    finally:
+        release_db_connection(conn)
+    body = ''.join(parts)
+    trace_add('rows', rows)
+    
+    headers = {
+        **JSON_HEADERS,
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'Content-Disposition': f'attachment; filename="{resource}.{export_format}"',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor, X-Export-Rows',
+        'X-Export-Rows': str(rows)
+    }
+    if truncated or rows == limit:
+        last = dict(zip(fields, last))
+        headers['X-Next-Cursor'] = encode_cursor(last['updated_at'], last['id'])
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def fetch_latest_resume(cur, user_id: int) -> dict:
+    """Последнее резюме пользователя вместе с навыками (один запрос)"""
+    execute_prepared(cur, SQL_RESUME_LATEST, (user_id,))
+    return fetch_dict(cur)
+
+
+def normalize_skills(skills: list) -> dict:
+    """Навыки из тела запроса: название -> уровень (при повторе побеждает последний)"""
+    result = {}
+    for skill in skills or []:
+        if skill.get('name'):
+            result[skill['name']] = skill.get('level', 'intermediate')
+    return result
+
+
+def insert_skills(cur, resume_id: int, skills: dict):
+    """Вставка навыков резюме одним многострочным INSERT"""
+    if not skills:
+        return
+    cur.execute(SQL_SKILLS_INSERT, (resume_id, list(skills.keys()), list(skills.values())))
+
+
+def sync_skills(cur, resume_id: int, skills: dict) -> tuple:
+    """Приведение навыков резюме к переданному набору: один DELETE и один INSERT"""
+    cur.execute(SQL_SKILLS_SELECT, (resume_id,))
+    existing = dict(cur.fetchall())
+    
+    removed = [name for name, level in existing.items() if skills.get(name) != level]
+    added = {name: level for name, level in skills.items() if existing.get(name) != level}
+    
+    if removed:
+        cur.execute(SQL_SKILLS_DELETE, (resume_id, removed))
+    insert_skills(cur, resume_id, added)
+    return len(added), len(removed)
+
+
 def handle_resumes(event: dict, action: str, method: str) -> dict:
     """Управление резюме"""
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    schema = SCHEMA
     
     if action == 'my' and method == 'GET':
         user = get_user_from_request(event)
@@ -165,48 +1836,34 @@ def handle_resumes(event: dict, action: str, method: str) -> dict:
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    SELECT r.id, r.position, r.experience_years, r.education, 
-                           r.desired_salary, r.summary, r.created_at
-                    FROM "{schema}".resumes r
-                    WHERE r.user_id = %s
-                    ORDER BY r.created_at DESC
-                    LIMIT 1
-                    """,
-                    (user['user_id'],)
-                )
-                row = cur.fetchone()
-                
-                if not row:
-                    return success_response({'resume': None})
-                
-                resume_id = row[0]
-                
-                cur.execute(
-                    f"""
-                    SELECT skill_name, proficiency_level
-                    FROM "{schema}".skills
-                    WHERE resume_id = %s
-                    """,
-                    (resume_id,)
-                )
-                skills = [{'name': s[0], 'level': s[1]} for s in cur.fetchall()]
-                
-                resume = {
-                    'id': row[0],
-                    'position': row[1],
-                    'experience_years': row[2],
-                    'education': row[3],
-                    'desired_salary': row[4],
-                    'summary': row[5],
-                    'created_at': row[6].isoformat() if row[6] else None,
-                    'skills': skills
-                }
-                
+                resume = fetch_latest_resume(cur, user['user_id'])
                 return success_response({'resume': resume})
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    elif action == 'get' and method == 'GET':
+        user = get_user_from_request(event)
+        if not user or user.get('role') not in ['admin', 'employer']:
+            return error_response('Unauthorized', 401)
+        
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            ids = [int(i) for i in _split_param(query_params.get('ids', ''))]
+        except ValueError:
+            return error_response('ids must be a comma-separated list of integers', 400)
+        if not ids:
+            return error_response('ids is required', 400)
+        if len(ids) > MAX_PAGE_SIZE:
+            return error_response(f'At most {MAX_PAGE_SIZE} ids per request', 400)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SQL_RESUMES_BY_IDS, (ids,))
+                resumes = fetch_dicts(cur)
+                return success_response(resumes)
+        finally:
+            release_db_connection(conn)
     
     elif action == 'create' and method == 'POST':
         user = get_user_from_request(event)
@@ -219,12 +1876,7 @@ def handle_resumes(event: dict, action: str, method: str) -> dict:
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    f"""
-                    INSERT INTO "{schema}".resumes 
-                    (user_id, position, experience_years, education, desired_salary, summary)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                    """,
+                    SQL_RESUME_INSERT,
                     (
                         user['user_id'],
                         body.get('position'),
@@ -236,65 +1888,90 @@ def handle_resumes(event: dict, action: str, method: str) -> dict:
                 )
                 resume_id = cur.fetchone()[0]
                 
-                for skill in body.get('skills', []):
-                    cur.execute(
-                        f"""
-                        INSERT INTO "{schema}".skills (resume_id, skill_name, proficiency_level)
-                        VALUES (%s, %s, %s)
-                        """,
-                        (resume_id, skill.get('name'), skill.get('level', 'intermediate'))
-                    )
+                insert_skills(cur, resume_id, normalize_skills(body.get('skills', [])))
                 
                 conn.commit()
                 
                 return success_response({'id': resume_id, 'message': 'Resume created'}, 201)
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    elif action == 'update' and method == 'PUT':
+        user = get_user_from_request(event)
+        if not user:
+            return error_response('Unauthorized', 401)
+        
+        body = json.loads(event.get('body', '{}'))
+        resume_id = body.get('id')
+        if resume_id is None or resume_id == '':
+            return error_response('Resume id is required', 400)
+        if isinstance(resume_id, bool) or not str(resume_id).isdigit() or int(resume_id) > PG_INT_MAX:
+            return error_response('id must be an integer', 400)
+        resume_id = int(resume_id)
+        
+        fields = [f for f in RESUME_UPDATABLE_FIELDS if f in body]
+        set_sql = ''.join(f'{f} = %s, ' for f in fields)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    UPDATE "{schema}".resumes
+                    SET {set_sql}updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND user_id = %s
+                    RETURNING id
+                    """,
+                    [body[f] for f in fields] + [resume_id, user['user_id']]
+                )
+                if not cur.fetchone():
+                    return error_response('Resume not found', 404)
+                
+                added, removed = 0, 0
+                if 'skills' in body:
+                    added, removed = sync_skills(cur, resume_id, normalize_skills(body['skills']))
+                
+                conn.commit()
+                
+                return success_response({
+                    'id': resume_id,
+                    'message': 'Resume updated',
+                    'skills_added': added,
+                    'skills_removed': removed
+                })
+        finally:
+            release_db_connection(conn)
     
     return error_response('Invalid action or method', 400)
 
 
 def handle_companies(event: dict, action: str, method: str) -> dict:
     """Управление компаниями"""
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    
     if action == 'list' and method == 'GET':
         query_params = event.get('queryStringParameters') or {}
-        limit = int(query_params.get('limit', 20))
-        offset = int(query_params.get('offset', 0))
+        try:
+            limit, offset, cursor = parse_pagination(query_params, 'number')
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        if cursor:
+            sql, params = SQL_COMPANIES_PAGE_AFTER, (cursor[0], cursor[1], limit, 0)
+        else:
+            sql, params = SQL_COMPANIES_PAGE, (limit, offset)
         
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    SELECT c.id, c.name, c.description, c.rating, c.reviews_count, c.website,
-                           COUNT(v.id) as vacancies_count
-                    FROM "{schema}".companies c
-                    LEFT JOIN "{schema}".vacancies v ON c.id = v.company_id AND v.is_active = TRUE
-                    GROUP BY c.id, c.name, c.description, c.rating, c.reviews_count, c.website
-                    ORDER BY c.rating DESC
-                    LIMIT %s OFFSET %s
-                    """,
-                    (limit, offset)
-                )
-                rows = cur.fetchall()
+                execute_prepared(cur, sql, params)
+                companies = fetch_dicts(cur)
                 
-                companies = []
-                for row in rows:
-                    companies.append({
-                        'id': row[0],
-                        'name': row[1],
-                        'description': row[2],
-                        'rating': float(row[3]) if row[3] else 0.0,
-                        'reviews_count': row[4],
-                        'website': row[5],
-                        'vacancies_count': row[6]
-                    })
-                
-                return success_response(companies)
+                next_cursor = encode_cursor(companies[-1]['rating'], companies[-1]['id']) if len(companies) == limit else None
+                return success_response(companies, extra={'next_cursor': next_cursor})
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    elif action == 'export' and method == 'GET':
+        return export_rows(event, 'companies')
     
     elif action == 'create' and method == 'POST':
         user = get_user_from_request(event)
@@ -306,34 +1983,267 @@ def handle_companies(event: dict, action: str, method: str) -> dict:
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    INSERT INTO "{schema}".companies (name, description, website)
-                    VALUES (%s, %s, %s)
-                    RETURNING id
-                    """,
-                    (body.get('name'), body.get('description'), body.get('website'))
-                )
+                cur.execute(SQL_COMPANY_INSERT, (body.get('name'), body.get('description'), body.get('website')))
                 company_id = cur.fetchone()[0]
                 conn.commit()
+                invalidate_response_cache('companies')
                 
                 return success_response({'id': company_id, 'message': 'Company created'}, 201)
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    elif action == 'reconcile' and method == 'POST':
+        user = get_user_from_request(event)
+        if not user or user.get('role') != 'admin':
+            return error_response('Unauthorized', 401)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SQL_COMPANY_RECONCILE)
+                fixed = cur.fetchone()[0]
+                conn.commit()
+                if fixed:
+                    invalidate_response_cache('companies')
+                
+                return success_response({'fixed': fixed, 'message': 'Vacancy counters reconciled'})
+        finally:
+            release_db_connection(conn)
+    
+    return error_response('Invalid action or method', 400)
+
+
+def handle_me(event: dict) -> dict:
+    """Профиль текущего пользователя"""
+    user = get_user_from_request(event)
+    if not user:
+        return error_response('Unauthorized', 401)
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_USER_PROFILE, (user['user_id'],))
+            profile = fetch_dict(cur)
+    finally:
+        release_db_connection(conn)
+    
+    if not profile:
+        return error_response('User not found', 404)
+    return success_response(profile)
+
+
+def _stats_item(row: dict) -> dict:
+    """Строка витрины в ответе: число вакансий и перцентили зарплат"""
+    item = {'key': row['key'], 'vacancies_count': row['vacancies_count']}
+    if row['label'] is not None:
+        item['label'] = row['label']
+    for column in ('salary_min', 'salary_max'):
+        item[column] = {p: row[f'{column}_{p}'] for p in ('p25', 'p50', 'p75')}
+    return item
+
+
+def load_market_stats() -> dict:
+    """
+    Снимок витрины из кэша процесса (STATS_CACHE_TTL); витрина небольшая,
+    поэтому читается целиком, а фильтры применяются в памяти
+    """
+    now = time.monotonic()
+    with _stats_lock:
+        if _stats_cache['data'] is not None and _stats_cache['expires_at'] > now:
+            return _stats_cache['data']
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_STATS_REFRESHED_AT)
+            refreshed_at = cur.fetchone()[0]
+            cur.execute(SQL_STATS_SELECT)
+            rows = fetch_dicts(cur)
+    finally:
+        release_db_connection(conn)
+    
+    data = {'refreshed_at': refreshed_at, 'overall': None, 'dimensions': {name: [] for name in STATS_DIMENSIONS}}
+    for row in rows:
+        if row['dimension'] == 'all':
+            data['overall'] = _stats_item(row)
+        elif row['dimension'] in data['dimensions']:
+            data['dimensions'][row['dimension']].append(_stats_item(row))
+    with _stats_lock:
+        _stats_cache.update(data=data, expires_at=now + STATS_CACHE_TTL)
+    return data
+
+
+def refresh_market_stats(conn, source: str, min_interval: int = 0) -> dict:
+    """
+    REFRESH MATERIALIZED VIEW CONCURRENTLY с записью в журнал обновлений.
+    Пропускается, если витрину уже обновляет другой процесс или она
+    обновлялась позже min_interval секунд назад.
+    """
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (STATS_REFRESH_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return {'refreshed': False, 'reason': 'in_progress'}
+        if min_interval:
+            cur.execute(SQL_STATS_RECENTLY_REFRESHED, (min_interval,))
+            if cur.fetchone()[0]:
+                conn.rollback()
+                return {'refreshed': False, 'reason': 'recently_refreshed'}
+        started = time.perf_counter()
+        cur.execute(SQL_STATS_REFRESH)
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        cur.execute(SQL_STATS_LOG_INSERT, (source, duration_ms))
+        refreshed_at = cur.fetchone()[0]
+        cur.execute(SQL_STATS_LOG_CLEANUP)
+        conn.commit()
+    with _stats_lock:
+        _stats_cache.update(data=None, expires_at=0.0)
+    return {'refreshed': True, 'duration_ms': duration_ms, 'refreshed_at': refreshed_at}
+
+
+def refresh_stats_after_import(conn) -> dict:
+    """Обновление витрины после импорта; импорт уже зафиксирован, поэтому ошибка не роняет ответ"""
+    try:
+        return refresh_market_stats(conn, 'import', STATS_REFRESH_MIN_INTERVAL)
+    except psycopg2.Error as e:
+        conn.rollback()
+        return {'refreshed': False, 'reason': 'error', 'error': str(e).strip()}
+
+
+def scheduled_stats_refresh() -> dict:
+    """Обновление витрины по событию {"refresh_stats": true} от триггера-таймера"""
+    conn = get_db_connection()
+    try:
+        return refresh_market_stats(conn, 'schedule')
+    finally:
+        release_db_connection(conn)
+
+
+def handle_stats(event: dict, action: str, method: str) -> dict:
+    """Статистика рынка: перцентили зарплат и число вакансий по измерениям"""
+    if action == 'list' and method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        dimensions = _split_param(query_params.get('dimension', '')) or list(STATS_DIMENSIONS)
+        unknown = [name for name in dimensions if name not in STATS_DIMENSIONS]
+        if unknown:
+            return error_response(f"Unknown dimension: {', '.join(unknown)}. Allowed: {', '.join(STATS_DIMENSIONS)}", 400)
+        try:
+            limit = max(1, min(int(query_params.get('limit', STATS_DEFAULT_LIMIT)), STATS_MAX_LIMIT))
+        except ValueError:
+            return error_response('limit must be an integer', 400)
+        key = query_params.get('key', '').strip()
+        
+        stats = load_market_stats()
+        data = {'overall': stats['overall']}
+        for name in dimensions:
+            items = stats['dimensions'][name]
+            if key:
+                # Слова названий хранятся в нижнем регистре
+                items = [item for item in items if item['key'] in (key, key.lower())]
+            data[name] = items[:limit]
+        return success_response(data, extra={'refreshed_at': stats['refreshed_at']})
+    
+    elif action == 'refresh' and method == 'POST':
+        user = get_user_from_request(event)
+        if not user or user.get('role') != 'admin':
+            return error_response('Unauthorized', 401)
+        
+        conn = get_db_connection()
+        try:
+            return success_response(refresh_market_stats(conn, 'manual'))
+        finally:
+            release_db_connection(conn)
     
     return error_response('Invalid action or method', 400)
 
 
-def success_response(data, status_code: int = 200) -> dict:
+def parse_batch_requests(body: str) -> list:
+    """Проверка списка подзапросов batch: [{id, resource, action, params}]"""
+    try:
+        data = json.loads(body or '{}')
+    except json.JSONDecodeError:
+        raise ValueError('Body must be JSON: {"requests": [...]}')
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('requests must be a non-empty list')
+    if len(items) > BATCH_MAX_REQUESTS:
+        raise ValueError(f'At most {BATCH_MAX_REQUESTS} requests per batch')
+    
+    requests, seen = [], set()
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f'Request {number} must be an object')
+        request_id = str(item.get('id') or number)
+        if request_id in seen:
+            raise ValueError(f'Duplicate request id: {request_id}')
+        seen.add(request_id)
+        resource = item.get('resource', '')
+        if resource == 'batch':
+            raise ValueError('Nested batch is not allowed')
+        if item.get('action') == 'export':
+            raise ValueError('Export is not allowed in batch')
+        params = item.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError(f'params of request {request_id} must be an object')
+        params = {k: str(v) for k, v in params.items()}
+        params.update(resource=resource, action=item.get('action', 'list'))
+        requests.append((request_id, params))
+    return requests
+
+
+def handle_batch(event: dict) -> dict:
+    """
+    Несколько GET-подзапросов за один вызов: одно соединение из пула
+    и один снимок данных (REPEATABLE READ, READ ONLY)
+    """
+    try:
+        requests = parse_batch_requests(event.get('body'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    conn = get_db_connection()
+    _batch.conn = conn
+    results = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            for request_id, params in requests:
+                sub_event = dict(event, httpMethod='GET', queryStringParameters=params, body=None)
+                # Ошибка подзапроса откатывает только его точку сохранения, а не весь снимок
+                cur.execute('SAVEPOINT batch_item')
+                try:
+                    response = route_request(sub_event, params['resource'], params['action'], 'GET')
+                    cur.execute('RELEASE SAVEPOINT batch_item')
+                except Exception as e:
+                    cur.execute('ROLLBACK TO SAVEPOINT batch_item')
+                    response = error_response(str(e), 500)
+                results.append((request_id, response))
+    finally:
+        _batch.conn = None
+        release_db_connection(conn)
+    
+    # Тела подзапросов уже сериализованы, поэтому ответ собирается без повторного разбора JSON
+    items = ','.join(
+        f'{dumps(request_id)}:{{"status":{response["statusCode"]},"body":{response["body"]}}}'
+        for request_id, response in results
+    )
+    return {
+        'statusCode': 200,
+        'headers': JSON_HEADERS,
+        'body': f'{{"success":true,"data":{{{items}}}}}',
+        'isBase64Encoded': False
+    }
+
+
+def success_response(data, status_code: int = 200, extra: dict = None) -> dict:
     """Успешный ответ"""
+    payload = {'success': True, 'data': data}
+    if extra:
+        payload.update(extra)
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Credentials': 'true'
-        },
-        'body': json.dumps({'success': True, 'data': data}),
+        'headers': JSON_HEADERS,
+        'body': dumps(payload),
         'isBase64Encoded': False
     }
 
@@ -342,11 +2252,15 @@ def error_response(message: str, status_code: int) -> dict:
     """Ответ с ошибкой"""
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Credentials': 'true'
-        },
-        'body': json.dumps({'success': False, 'error': message}),
+        'headers': JSON_HEADERS,
+        'body': dumps({'success': False, 'error': message}),
         'isBase64Encoded': False
     }
+
+
+if WARMUP_ON_IMPORT:
+    # Ошибка прогрева не должна ломать загрузку функции: первый запрос подключится сам
+    try:
+        warm_up()
+    except Exception:
+        pass
@@ -1,31 +1,204 @@
 import json
+import math
 import os
+import random
 import hashlib
 import secrets
-from datetime import datetime, timedelta
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 import psycopg2
 import jwt
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# concurrent.futures импортируется только при первом хешировании пароля (register/login)
+SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key')
+WARMUP_ON_IMPORT = os.environ.get('WARMUP_ON_IMPORT', '0') == '1'
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '1024'))
+TOKEN_CACHE_TTL = 300
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '1024'))
+
+PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', '16384'))
+PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+# Хеш, с которым сверяется пароль несуществующего пользователя: вход по неизвестному
+# email стоит столько же, сколько по известному, и не выдаёт зарегистрированные адреса
+DUMMY_PASSWORD_HASH = f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${'00' * 16}${'00' * 32}"
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+
+SESSION_TTL = timedelta(days=7)
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', '10'))
+SESSION_SWEEP_BATCH = int(os.environ.get('SESSION_SWEEP_BATCH', '1000'))
+SESSION_SWEEP_MAX_BATCHES = int(os.environ.get('SESSION_SWEEP_MAX_BATCHES', '100'))
+REVOCATION_SYNC_INTERVAL = int(os.environ.get('REVOCATION_SYNC_INTERVAL', '30'))
+
+# Ограничение частоты login/register: корзина токенов на IP и на email
+# (BURST попыток сразу, затем PER_MINUTE в минуту). RATE_LIMIT_SHARED=1
+# дополнительно сверяется с общей таблицей auth_rate_limits для всех экземпляров
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', '0') == '1'
+RATE_LIMITS = {
+    'ip': (int(os.environ.get('RATE_LIMIT_IP_BURST', '20')), float(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '30'))),
+    'email': (int(os.environ.get('RATE_LIMIT_EMAIL_BURST', '5')), float(os.environ.get('RATE_LIMIT_EMAIL_PER_MINUTE', '5')))
+}
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_AGE = int(os.environ.get('DB_POOL_MAX_AGE', '300'))
+DB_POOL_PING_AFTER = int(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+# Горячие запросы выполняются через PREPARE/EXECUTE: разбор и план один раз
+# на соединение (PREPARED_STATEMENTS=0 отключает, например за pgbouncer)
+PREPARED_STATEMENTS = os.environ.get('PREPARED_STATEMENTS', '1') == '1'
+PREPARED_MAX_STATEMENTS = 256
+PREPARED_MAX_PER_CONNECTION = 64
+# Ошибки, после которых подготовленный запрос готовится заново:
+# statement не существует (сброс сессии) и смена типа результата после миграции
+PREPARED_RETRY_CODES = ('26000', '0A000')
+
+# Трассировка запросов: лог пишется для доли TRACE_SAMPLE_RATE запросов,
+# а также для медленных запросов, медленных SQL и ошибок
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_SLOW_REQUEST_MS = float(os.environ.get('TRACE_SLOW_REQUEST_MS', '1000'))
+TRACE_SLOW_QUERY_MS = float(os.environ.get('TRACE_SLOW_QUERY_MS', '200'))
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', '1') == '1'
+TRACE_MAX_QUERIES = 50
+TRACE_SQL_MAX_LENGTH = 300
+
+# Шаблоны заголовков: ответы не меняются на месте, поэтому словари общие
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Credentials': 'true'
+}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization',
+    'Access-Control-Max-Age': '86400',
+    'Access-Control-Allow-Credentials': 'true'
+}
+LOGOUT_HEADERS = {**JSON_HEADERS, 'X-Set-Cookie': 'session_token=; HttpOnly; Secure; SameSite=Strict; Max-Age=0; Path=/'}
+
+# Статичные запросы собираются со схемой один раз при загрузке модуля
+SQL_USER_EXISTS = f'SELECT id FROM "{SCHEMA}".users WHERE email = %s'
+SQL_USER_INSERT = (
+    f'INSERT INTO "{SCHEMA}".users (email, password_hash, full_name, phone, role) '
+    'VALUES (%s, %s, %s, %s, %s) RETURNING id, email, full_name, role'
+)
+SQL_USER_LOGIN = f'SELECT id, email, password_hash, full_name, role FROM "{SCHEMA}".users WHERE email = %s'
+SQL_USER_REHASH = f'UPDATE "{SCHEMA}".users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s'
+SQL_USER_PROFILE = f'SELECT id, email, full_name, phone, role, created_at FROM "{SCHEMA}".users WHERE id = %s'
+SQL_SESSION_INSERT = (
+    f'INSERT INTO "{SCHEMA}".user_sessions (user_id, session_token, token_id, expires_at) '
+    'VALUES (%s, %s, %s, %s)'
+)
+SQL_SESSION_EVICT = f"""
+    DELETE FROM "{SCHEMA}".user_sessions
+    WHERE id IN (
+        SELECT id FROM "{SCHEMA}".user_sessions
+        WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC
+        OFFSET %s
+    )
+    RETURNING token_id, expires_at
+"""
+SQL_SESSION_DELETE = (
+    f'DELETE FROM "{SCHEMA}".user_sessions WHERE session_token = %s OR token_id = %s '
+    'RETURNING user_id, token_id, expires_at'
+)
+SQL_RATE_LIMIT_TAKE = f"""
+    INSERT INTO "{SCHEMA}".auth_rate_limits AS r (key, tokens, updated_at, expires_at)
+    VALUES (%(key)s, %(capacity)s - 1, %(now)s, %(now)s + make_interval(secs => 1 / %(rate)s))
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = LEAST(%(capacity)s, r.tokens + EXTRACT(EPOCH FROM %(now)s - r.updated_at) * %(rate)s) - 1,
+        updated_at = %(now)s,
+        expires_at = %(now)s + make_interval(secs => (%(capacity)s - LEAST(%(capacity)s,
+            r.tokens + EXTRACT(EPOCH FROM %(now)s - r.updated_at) * %(rate)s) + 1) / %(rate)s)
+    WHERE LEAST(%(capacity)s, r.tokens + EXTRACT(EPOCH FROM %(now)s - r.updated_at) * %(rate)s) >= 1
+    RETURNING tokens
+"""
+SQL_REVOKED_ACTIVE = f'SELECT token_id, expires_at, revoked_at FROM "{SCHEMA}".revoked_tokens WHERE expires_at > %s'
+SQL_REVOKED_SINCE = f'SELECT token_id, expires_at, revoked_at FROM "{SCHEMA}".revoked_tokens WHERE revoked_at > %s'
+SQL_REVOKED_INSERT = f"""
+    INSERT INTO "{SCHEMA}".revoked_tokens (token_id, expires_at)
+    SELECT * FROM unnest(%s::varchar[], %s::timestamp[])
+    ON CONFLICT (token_id) DO NOTHING
+"""
+
+# Пул соединений живёт между тёплыми вызовами функции
+_pool = []
+_pool_meta = {}
+_pool_lock = threading.Lock()
+_pool_stats = {'hits': 0, 'misses': 0, 'recycled': 0, 'discarded': 0, 'overflow': 0}
+
+# Реестр подготовленных запросов: SQL -> (имя, текст с $1..$n, число параметров);
+# какие из них уже подготовлены, хранится в _pool_meta каждого соединения
+_prepared_sql = {}
+
+# Потоки для scrypt: hashlib отпускает GIL, параллельные логины не выстраиваются в очередь
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+# Кэш проверенных токенов: sha256(token) -> claims до истечения exp
+_token_cache = OrderedDict()
+# Кэш профилей пользователей: user_id -> данные для action=me
+_user_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'token_hits': 0, 'token_misses': 0, 'user_hits': 0, 'user_misses': 0}
+
+# Отозванные токены: jti -> expires_at, синхронизируются с revoked_tokens
+# раз в REVOCATION_SYNC_INTERVAL секунд, а не на каждый запрос
+_revoked = {'tokens': {}, 'synced_at': None, 'last_revoked_at': None}
+_revoked_lock = threading.Lock()
+
+# Трассировка текущего запроса (время соединения, SQL, сериализация)
+_trace = threading.local()
+
+# Корзины ограничителя частоты: ключ -> [токены, время обновления], LRU по RATE_LIMIT_MAX_KEYS
+_rate_buckets = OrderedDict()
+_rate_lock = threading.Lock()
+
+
 def handler(event: dict, context) -> dict:
     """
     API для регистрации, авторизации и управления сессиями пользователей.
-    Использует JWT токены и bcrypt для шифрования паролей.
+    Использует JWT токены и scrypt для хеширования паролей.
     """
+    trace = start_trace()
+    try:
+        response = dispatch(event)
+    finally:
+        _trace.current = None
+    return finish_trace(trace, event, response)
+
+
+def dispatch(event: dict) -> dict:
+    """Разбор метода и параметров запроса, вызов обработчика"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization',
-                'Access-Control-Max-Age': '86400',
-                'Access-Control-Allow-Credentials': 'true'
-            },
+            'headers': PREFLIGHT_HEADERS,
             'body': '',
             'isBase64Encoded': False
         }
+    if event.get('warmup'):
+        return {
+            'statusCode': 200,
+            'headers': JSON_HEADERS,
+            'body': dumps({'success': True, 'pool': warm_up(), 'caches': get_cache_stats()}),
+            'isBase64Encoded': False
+        }
     
     query_params = event.get('queryStringParameters') or {}
     action = query_params.get('action', '')
@@ -39,54 +212,538 @@ def handler(event: dict, context) -> dict:
             return get_current_user(event)
         elif method == 'POST' and action == 'logout':
             return logout_user(event)
+        elif method == 'POST' and action == 'sweep_sessions':
+            return sweep_sessions(event)
         else:
-            return error_response('Invalid action. Use ?action=register|login|me|logout', 400)
+            return error_response('Invalid action. Use ?action=register|login|me|logout|sweep_sessions', 400)
     except Exception as e:
+        trace_error(e)
         return error_response(str(e), 500)
 
 
+def _get_hash_executor():
+    """Пул потоков для хеширования паролей (создаётся при первом использовании)"""
+    global _hash_executor
+    if _hash_executor is None:
+        with _hash_executor_lock:
+            if _hash_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='kdf')
+    return _hash_executor
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Ключ scrypt для пароля"""
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=2 * 128 * r * n + 1024 * 1024, dklen=32
+    )
+
+
 def hash_password(password: str) -> str:
-    """Хеширование пароля с использованием SHA256 + соль"""
-    salt = secrets.token_hex(16)
-    pwd_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{salt}${pwd_hash}"
+    """Хеширование пароля scrypt в пуле потоков: scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(16)
+    n, r, p = PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+    key = _get_hash_executor().submit(_scrypt, password, salt, n, r, p).result()
+    return f"scrypt${n}${r}${p}${salt.hex()}${key.hex()}"
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Проверка пароля"""
+    """Проверка пароля (scrypt или старый формат salt$sha256)"""
     try:
-        salt, pwd_hash = hashed.split('$')
-        test_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-        return test_hash == pwd_hash
+        parts = hashed.split('$')
+        if len(parts) == 2:
+            salt, pwd_hash = parts
+            test_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+            return secrets.compare_digest(test_hash, pwd_hash)
+        
+        scheme, n, r, p, salt, pwd_hash = parts
+        if scheme != 'scrypt':
+            return False
+        key = _get_hash_executor().submit(
+            _scrypt, password, bytes.fromhex(salt), int(n), int(r), int(p)
+        ).result()
+        return secrets.compare_digest(key.hex(), pwd_hash)
     except:
         return False
 
 
-def create_jwt_token(user_id: int, email: str, role: str) -> str:
+def password_needs_rehash(hashed: str) -> bool:
+    """Хеш в старом формате или с устаревшими параметрами scrypt"""
+    return not hashed.startswith(f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$")
+
+
+def fetch_dict(cur) -> dict:
+    """Одна строка результата как словарь по именам колонок (или None)"""
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cur.description], row))
+
+
+def _json_default(value):
+    """Типы БД, которые не сериализует json/orjson сам"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data) -> str:
+    """JSON-сериализация: orjson, если установлен, иначе стандартный json"""
+    started = time.perf_counter()
+    if orjson is not None:
+        result = orjson.dumps(data, default=_json_default).decode()
+    else:
+        result = json.dumps(data, default=_json_default, ensure_ascii=False)
+    trace_add('serialize_ms', (time.perf_counter() - started) * 1000)
+    return result
+
+
+def create_jwt_token(user_id: int, email: str, role: str, token_id: str = None) -> str:
     """Создание JWT токена"""
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
     payload = {
         'user_id': user_id,
         'email': email,
         'role': role,
-        'exp': datetime.utcnow() + timedelta(days=7)
+        'exp': datetime.utcnow() + SESSION_TTL
     }
-    return jwt.encode(payload, secret, algorithm='HS256')
+    if token_id:
+        payload['jti'] = token_id
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def _lru_get(cache: OrderedDict, key, now: float):
+    """Запись LRU-кэша, если она ещё не истекла"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry['expires_at'] <= now:
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry
+
+
+def _lru_put(cache: OrderedDict, key, entry: dict, max_entries: int):
+    """Запись в LRU-кэш с вытеснением самых старых ключей"""
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+def _token_key(token: str) -> bytes:
+    """Ключ кэша токенов"""
+    return hashlib.sha256(token.encode()).digest()
 
 
 def verify_jwt_token(token: str) -> dict:
-    """Проверка JWT токена"""
-    try:
-        secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-        return jwt.decode(token, secret, algorithms=['HS256'])
-    except:
+    """Проверка JWT токена (с кэшем уже проверенных токенов)"""
+    key = _token_key(token)
+    now = time.time()
+    with _cache_lock:
+        entry = _lru_get(_token_cache, key, now)
+    if entry is not None:
+        _cache_stats['token_hits'] += 1
+        claims = entry['claims']
+    else:
+        _cache_stats['token_misses'] += 1
+        try:
+            claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        except:
+            return None
+        
+        expires_at = claims.get('exp', now + TOKEN_CACHE_TTL)
+        with _cache_lock:
+            _lru_put(_token_cache, key, {'claims': claims, 'expires_at': expires_at}, TOKEN_CACHE_MAX_ENTRIES)
+    
+    if claims.get('jti') and is_token_revoked(claims['jti']):
         return None
+    return claims
 
 
-def get_db_connection():
-    """Подключение к базе данных"""
+def _sync_revoked_tokens():
+    """Подгрузка отозванных токенов из БД (полная при первом вызове, затем только новые)"""
+    now = datetime.utcnow()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            if _revoked['last_revoked_at'] is None:
+                cur.execute(SQL_REVOKED_ACTIVE, (now,))
+            else:
+                # Перекрытие окна ловит строки, закоммиченные позже своего revoked_at
+                cur.execute(SQL_REVOKED_SINCE, (_revoked['last_revoked_at'] - timedelta(seconds=60),))
+            rows = cur.fetchall()
+    finally:
+        release_db_connection(conn)
+    
+    tokens = _revoked['tokens']
+    for token_id, expires_at, revoked_at in rows:
+        tokens[token_id] = expires_at
+        if _revoked['last_revoked_at'] is None or revoked_at > _revoked['last_revoked_at']:
+            _revoked['last_revoked_at'] = revoked_at
+    if _revoked['last_revoked_at'] is None:
+        _revoked['last_revoked_at'] = now
+    for token_id in [t for t, expires_at in tokens.items() if expires_at <= now]:
+        del tokens[token_id]
+    _revoked['synced_at'] = time.monotonic()
+
+
+def is_token_revoked(token_id: str) -> bool:
+    """Проверка отзыва токена по множеству в памяти процесса"""
+    with _revoked_lock:
+        if _revoked['synced_at'] is None or time.monotonic() - _revoked['synced_at'] > REVOCATION_SYNC_INTERVAL:
+            _sync_revoked_tokens()
+        return token_id in _revoked['tokens']
+
+
+def revoke_tokens(cur, tokens: list):
+    """Отзыв токенов [(jti, expires_at)]: запись в БД и в множество процесса"""
+    tokens = [(token_id, expires_at) for token_id, expires_at in tokens if token_id]
+    if not tokens:
+        return
+    cur.execute(SQL_REVOKED_INSERT, ([t[0] for t in tokens], [t[1] for t in tokens]))
+    with _revoked_lock:
+        _revoked['tokens'].update(tokens)
+
+
+def invalidate_user_cache(user_id: int = None, token: str = None):
+    """Сброс кэшированных профиля и токена (при выходе)"""
+    with _cache_lock:
+        if user_id is not None:
+            _user_cache.pop(user_id, None)
+        if token:
+            _token_cache.pop(_token_key(token), None)
+
+
+def get_cache_stats() -> dict:
+    """Счётчики попаданий в кэши процесса"""
+    with _cache_lock:
+        return dict(_cache_stats, tokens=len(_token_cache), users=len(_user_cache))
+
+
+class TracingCursor(psycopg2.extensions.cursor):
+    """Курсор, записывающий длительность и число строк каждого SQL в трассировку запроса"""
+    
+    def execute(self, query, vars=None):
+        trace = getattr(_trace, 'current', None)
+        if trace is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(trace, query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+
+def start_trace() -> dict:
+    """Начало трассировки запроса в текущем потоке"""
+    trace = {
+        'started': time.perf_counter(), 'connect_ms': 0.0, 'db_ms': 0.0, 'serialize_ms': 0.0,
+        'query_count': 0, 'rows': 0, 'slow_queries': 0, 'queries': [], 'error': None
+    }
+    _trace.current = trace
+    return trace
+
+
+def trace_add(metric: str, ms: float):
+    """Добавление времени к метрике текущей трассировки"""
+    trace = getattr(_trace, 'current', None)
+    if trace is not None:
+        trace[metric] += ms
+
+
+def trace_error(error: Exception):
+    """Запись исключения, превращённого в ответ 500"""
+    trace = getattr(_trace, 'current', None)
+    if trace is not None:
+        trace['error'] = f'{type(error).__name__}: {str(error).strip()}'
+
+
+def record_query(trace: dict, query, ms: float, rowcount: int):
+    """Учёт выполненного SQL: суммарное время, строки, медленные запросы"""
+    trace['db_ms'] += ms
+    trace['query_count'] += 1
+    trace['rows'] += max(rowcount, 0)
+    if ms >= TRACE_SLOW_QUERY_MS:
+        trace['slow_queries'] += 1
+    if len(trace['queries']) < TRACE_MAX_QUERIES:
+        trace['queries'].append((query, ms, rowcount))
+
+
+def _sql_text(query) -> str:
+    """Текст SQL для лога в одну строку"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())[:TRACE_SQL_MAX_LENGTH]
+
+
+def finish_trace(trace: dict, event: dict, response: dict) -> dict:
+    """Завершение трассировки: заголовок Server-Timing и строка JSON-лога"""
+    total_ms = (time.perf_counter() - trace['started']) * 1000
+    if TRACE_SERVER_TIMING:
+        timing = (
+            f'connect;dur={trace["connect_ms"]:.1f}, '
+            f'db;dur={trace["db_ms"]:.1f};desc="{trace["query_count"]} queries", '
+            f'serialize;dur={trace["serialize_ms"]:.1f}, total;dur={total_ms:.1f}'
+        )
+        response = dict(response, headers={**response.get('headers', {}), 'Server-Timing': timing, 'Timing-Allow-Origin': '*'})
+    
+    sampled = random.random() < TRACE_SAMPLE_RATE
+    slow = total_ms >= TRACE_SLOW_REQUEST_MS or trace['slow_queries'] > 0
+    if sampled or slow or trace['error']:
+        query_params = event.get('queryStringParameters') or {}
+        print(json.dumps({
+            'type': 'trace',
+            'function': 'auth',
+            'method': event.get('httpMethod', 'GET'),
+            'params': {k: v for k, v in query_params.items() if k in ('resource', 'action')},
+            'status': response.get('statusCode'),
+            'total_ms': round(total_ms, 2),
+            'connect_ms': round(trace['connect_ms'], 2),
+            'db_ms': round(trace['db_ms'], 2),
+            'serialize_ms': round(trace['serialize_ms'], 2),
+            'query_count': trace['query_count'],
+            'rows': trace['rows'],
+            'sampled': sampled,
+            'slow': slow,
+            'error': trace['error'],
+            # Накопленные счётчики кэшей процесса: по ним видно долю попаданий
+            'caches': get_cache_stats(),
+            'queries': [
+                {'sql': _sql_text(query), 'ms': round(ms, 2), 'rows': rowcount}
+                for query, ms, rowcount in trace['queries']
+            ]
+        }, ensure_ascii=False, default=str))
+    return response
+
+
+def _connect():
+    """Новое подключение к базе данных"""
     dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn, cursor_factory=TracingCursor)
+    trace_add('connect_ms', (time.perf_counter() - started) * 1000)
+    now = time.monotonic()
+    _pool_meta[conn] = {'created_at': now, 'last_used': now}
+    return conn
+
+
+def _discard_connection(conn, reason: str = 'discarded'):
+    """Закрытие соединения без возврата в пул"""
+    _pool_meta.pop(conn, None)
+    _pool_stats[reason] += 1
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_connection_healthy(conn, meta: dict) -> bool:
+    """Проверка соединения перед выдачей из пула"""
+    if conn.closed:
+        return False
+    if time.monotonic() - meta['last_used'] < DB_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def get_db_connection():
+    """Получение соединения из пула или новое подключение"""
+    while True:
+        with _pool_lock:
+            if not _pool:
+                _pool_stats['misses'] += 1
+                break
+            conn = _pool.pop()
+        meta = _pool_meta.get(conn)
+        if meta is None or time.monotonic() - meta['created_at'] > DB_POOL_MAX_AGE:
+            _discard_connection(conn, 'recycled')
+            continue
+        if not _is_connection_healthy(conn, meta):
+            _discard_connection(conn)
+            continue
+        _pool_stats['hits'] += 1
+        return conn
+    return _connect()
+
+
+def release_db_connection(conn):
+    """Возврат соединения в пул (сломанные и старые соединения закрываются)"""
+    meta = _pool_meta.get(conn)
+    if meta is None or conn.closed:
+        _discard_connection(conn)
+        return
+    try:
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Exception:
+        _discard_connection(conn)
+        return
+    now = time.monotonic()
+    if now - meta['created_at'] > DB_POOL_MAX_AGE:
+        _discard_connection(conn, 'recycled')
+        return
+    meta['last_used'] = now
+    with _pool_lock:
+        if len(_pool) < DB_POOL_MAX_SIZE:
+            _pool.append(conn)
+            return
+    _discard_connection(conn, 'overflow')
+
+
+def warm_up() -> dict:
+    """Прогрев до первого запроса: соединение в пул и множество отозванных токенов"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+    finally:
+        release_db_connection(conn)
+    with _revoked_lock:
+        _sync_revoked_tokens()
+    return get_pool_stats()
+
+
+def _numbered_sql(sql: str) -> tuple:
+    """Текст для PREPARE: %s -> $1..$n, %% -> %"""
+    parts = sql.replace('%%', '\0').split('%s')
+    text = parts[0] + ''.join(f'${number}{part}' for number, part in enumerate(parts[1:], start=1))
+    return text.replace('\0', '%'), len(parts) - 1
+
+
+def execute_prepared(cur, sql: str, params=(), retry: bool = True):
+    """
+    Выполнение запроса через EXECUTE: PREPARE при первом использовании на
+    соединении, повторная подготовка после сброса сессии или миграции
+    """
+    conn = cur.connection
+    meta = _pool_meta.get(conn)
+    if not PREPARED_STATEMENTS or meta is None:
+        return cur.execute(sql, params)
+    statement = _prepared_sql.get(sql)
+    if statement is None:
+        if len(_prepared_sql) >= PREPARED_MAX_STATEMENTS:
+            return cur.execute(sql, params)
+        text, count = _numbered_sql(sql)
+        statement = _prepared_sql[sql] = ('stmt_' + hashlib.sha1(sql.encode()).hexdigest()[:16], text, count)
+    
+    name, text, count = statement
+    prepared = meta.setdefault('prepared', set())
+    if name not in prepared and len(prepared) >= PREPARED_MAX_PER_CONNECTION:
+        return cur.execute(sql, params)
+    # Повтор безопасен, только если ошибка не оборвёт уже начатую транзакцию
+    idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        if name not in prepared:
+            cur.execute(f'PREPARE {name} AS {text}')
+            prepared.add(name)
+        return cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f'EXECUTE {name}', params)
+    except psycopg2.Error as e:
+        if e.pgcode not in PREPARED_RETRY_CODES:
+            raise
+        if not (retry and idle):
+            # Посреди транзакции чинить нельзя: соединение закроется при возврате в пул
+            _pool_meta.pop(conn, None)
+            raise
+        conn.rollback()
+        cur.execute('DEALLOCATE ALL')
+        prepared.clear()
+        return execute_prepared(cur, sql, params, retry=False)
+
+
+def get_pool_stats() -> dict:
+    """Счётчики пула соединений"""
+    with _pool_lock:
+        return dict(_pool_stats, idle=len(_pool), open=len(_pool_meta))
+
+
+def create_session(cur, user_id: int, email: str, role: str) -> tuple:
+    """Выдача JWT и сессии; самые старые сессии сверх лимита отзываются"""
+    token_id = secrets.token_hex(16)
+    token = create_jwt_token(user_id, email, role, token_id)
+    session_token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + SESSION_TTL
+    
+    execute_prepared(cur, SQL_SESSION_INSERT, (user_id, session_token, token_id, expires_at))
+    execute_prepared(cur, SQL_SESSION_EVICT, (user_id, MAX_SESSIONS_PER_USER))
+    revoke_tokens(cur, cur.fetchall())
+    return token, session_token
+
+
+def client_ip(event: dict) -> str:
+    """IP клиента из контекста запроса облачной функции"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    forwarded = event.get('headers', {}).get('X-Forwarded-For', '')
+    return forwarded.split(',')[0].strip() or 'unknown'
+
+
+def _take_local_token(key: str, capacity: int, per_minute: float) -> float:
+    """Списание токена из корзины процесса: 0 или сколько секунд ждать"""
+    rate = per_minute / 60
+    now = time.monotonic()
+    with _rate_lock:
+        bucket = _rate_buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            _rate_buckets.move_to_end(key)
+        if tokens < 1:
+            _rate_buckets[key] = [tokens, now]
+            return (1 - tokens) / rate
+        _rate_buckets[key] = [tokens - 1, now]
+        while len(_rate_buckets) > RATE_LIMIT_MAX_KEYS:
+            _rate_buckets.popitem(last=False)
+    return 0.0
+
+
+def _take_shared_token(key: str, capacity: int, per_minute: float) -> float:
+    """Списание токена из общей корзины в auth_rate_limits (одна атомарная вставка)"""
+    rate = per_minute / 60
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_RATE_LIMIT_TAKE, {'key': key, 'capacity': capacity, 'rate': rate, 'now': datetime.utcnow()})
+            allowed = cur.fetchone() is not None
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    return 0.0 if allowed else 1 / rate
+
+
+def check_rate_limit(event: dict, email: str) -> dict:
+    """Ответ 429, если исчерпана корзина IP или email; проверка в памяти идёт до любого SQL"""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    keys = [('ip', client_ip(event))]
+    if email:
+        keys.append(('email', email.lower()))
+    keys = [(kind, f'{kind}:' + hashlib.sha256(value.encode()).hexdigest()[:40]) for kind, value in keys]
+    
+    retry_after = 0.0
+    for kind, key in keys:
+        retry_after = _take_local_token(key, *RATE_LIMITS[kind])
+        if retry_after:
+            break
+    if not retry_after and RATE_LIMIT_SHARED:
+        for kind, key in keys:
+            retry_after = _take_shared_token(key, *RATE_LIMITS[kind])
+            if retry_after:
+                break
+    if not retry_after:
+        return None
+    
+    response = error_response('Too many attempts, try again later', 429)
+    return dict(response, headers={**response['headers'], 'Retry-After': str(math.ceil(retry_after))})
 
 
 def register_user(event: dict) -> dict:
@@ -98,50 +755,40 @@ def register_user(event: dict) -> dict:
     full_name = body.get('full_name', '').strip()
     phone = body.get('phone', '').strip()
     
+    limited = check_rate_limit(event, email)
+    if limited:
+        return limited
+    
     if not email or not password or not full_name:
         return error_response('Email, password and full_name are required', 400)
     
     if len(password) < 6:
         return error_response('Password must be at least 6 characters', 400)
     
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute(f"SELECT id FROM \"{schema}\".users WHERE email = %s", (email,))
+            execute_prepared(cur, SQL_USER_EXISTS, (email,))
             if cur.fetchone():
                 return error_response('Email already exists', 400)
             
             password_hash = hash_password(password)
             
-            cur.execute(
-                f"INSERT INTO \"{schema}\".users (email, password_hash, full_name, phone, role) VALUES (%s, %s, %s, %s, %s) RETURNING id, email, full_name, role",
-                (email, password_hash, full_name, phone, 'user')
-            )
+            cur.execute(SQL_USER_INSERT, (email, password_hash, full_name, phone, 'user'))
             user_data = cur.fetchone()
             conn.commit()
             
             user_id, user_email, user_name, user_role = user_data
-            token = create_jwt_token(user_id, user_email, user_role)
-            
-            session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.utcnow() + timedelta(days=7)
-            
-            cur.execute(
-                "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
-                (user_id, session_token, expires_at)
-            )
+            token, session_token = create_session(cur, user_id, user_email, user_role)
             conn.commit()
             
             return {
                 'statusCode': 201,
                 'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Credentials': 'true',
+                    **JSON_HEADERS,
                     'X-Set-Cookie': f'session_token={session_token}; HttpOnly; Secure; SameSite=Strict; Max-Age=604800; Path=/'
                 },
-                'body': json.dumps({
+                'body': dumps({
                     'success': True,
                     'token': token,
                     'user': {
@@ -154,7 +801,7 @@ def register_user(event: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 def login_user(event: dict) -> dict:
@@ -164,43 +811,41 @@ def login_user(event: dict) -> dict:
     email = body.get('email', '').strip()
     password = body.get('password', '')
     
+    limited = check_rate_limit(event, email)
+    if limited:
+        return limited
+    
     if not email or not password:
         return error_response('Email and password are required', 400)
     
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute(
-                f"SELECT id, email, password_hash, full_name, role FROM \"{schema}\".users WHERE email = %s",
-                (email,)
-            )
+            execute_prepared(cur, SQL_USER_LOGIN, (email,))
             user_data = cur.fetchone()
             
-            if not user_data or not verify_password(password, user_data[2]):
+            if not user_data:
+                verify_password(password, DUMMY_PASSWORD_HASH)
+                return error_response('Invalid email or password', 401)
+            if not verify_password(password, user_data[2]):
+                # Старый формат хеша проверяется быстрее: выравниваем время и здесь
+                if password_needs_rehash(user_data[2]):
+                    verify_password(password, DUMMY_PASSWORD_HASH)
                 return error_response('Invalid email or password', 401)
             
-            user_id, user_email, _, user_name, user_role = user_data
-            token = create_jwt_token(user_id, user_email, user_role)
-            
-            session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.utcnow() + timedelta(days=7)
-            
-            cur.execute(
-                f"INSERT INTO \"{schema}\".user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
-                (user_id, session_token, expires_at)
-            )
+            user_id, user_email, password_hash, user_name, user_role = user_data
+            if password_needs_rehash(password_hash):
+                cur.execute(SQL_USER_REHASH, (hash_password(password), user_id))
+            token, session_token = create_session(cur, user_id, user_email, user_role)
             conn.commit()
             
             return {
                 'statusCode': 200,
                 'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Credentials': 'true',
+                    **JSON_HEADERS,
                     'X-Set-Cookie': f'session_token={session_token}; HttpOnly; Secure; SameSite=Strict; Max-Age=604800; Path=/'
                 },
-                'body': json.dumps({
+                'body': dumps({
                     'success': True,
                     'token': token,
                     'user': {
@@ -213,7 +858,7 @@ def login_user(event: dict) -> dict:
                 'isBase64Encoded': False
             }
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 def get_current_user(event: dict) -> dict:
@@ -232,41 +877,37 @@ def get_current_user(event: dict) -> dict:
     if not payload:
         return error_response('Invalid token', 401)
     
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                f"SELECT id, email, full_name, phone, role, created_at FROM \"{schema}\".users WHERE id = %s",
-                (payload['user_id'],)
-            )
-            user_data = cur.fetchone()
-            
-            if not user_data:
-                return error_response('User not found', 404)
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Credentials': 'true'
-                },
-                'body': json.dumps({
-                    'success': True,
-                    'user': {
-                        'id': user_data[0],
-                        'email': user_data[1],
-                        'full_name': user_data[2],
-                        'phone': user_data[3],
-                        'role': user_data[4],
-                        'created_at': user_data[5].isoformat() if user_data[5] else None
-                    }
-                }),
-                'isBase64Encoded': False
-            }
-    finally:
-        conn.close()
+    user_id = payload['user_id']
+    with _cache_lock:
+        entry = _lru_get(_user_cache, user_id, time.monotonic())
+    if entry is not None:
+        _cache_stats['user_hits'] += 1
+        user = entry['user']
+    else:
+        _cache_stats['user_misses'] += 1
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SQL_USER_PROFILE, (user_id,))
+                user = fetch_dict(cur)
+        finally:
+            release_db_connection(conn)
+        
+        if not user:
+            return error_response('User not found', 404)
+        
+        with _cache_lock:
+            _lru_put(_user_cache, user_id, {'user': user, 'expires_at': time.monotonic() + USER_CACHE_TTL}, USER_CACHE_MAX_ENTRIES)
+    
+    return {
+        'statusCode': 200,
+        'headers': JSON_HEADERS,
+        'body': dumps({
+            'success': True,
+            'user': user
+        }),
+        'isBase64Encoded': False
+    }
 
 
 def logout_user(event: dict) -> dict:
@@ -279,25 +920,93 @@ def logout_user(event: dict) -> dict:
             session_token = cookie.split('=')[1].strip()
             break
     
-    if session_token:
-        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    revoked = []
+    token_id = None
+    auth_header = event.get('headers', {}).get('X-Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token = auth_header.replace('Bearer ', '')
+        payload = verify_jwt_token(token)
+        invalidate_user_cache(payload['user_id'] if payload else None, token)
+        if payload and payload.get('jti'):
+            token_id = payload['jti']
+            revoked.append((token_id, datetime.utcfromtimestamp(payload['exp'])))
+    
+    if session_token or token_id:
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute(f"DELETE FROM \"{schema}\".user_sessions WHERE session_token = %s", (session_token,))
+                cur.execute(SQL_SESSION_DELETE, (session_token, token_id))
+                for user_id, session_token_id, expires_at in cur.fetchall():
+                    invalidate_user_cache(user_id)
+                    revoked.append((session_token_id, expires_at))
+                revoke_tokens(cur, revoked)
                 conn.commit()
         finally:
-            conn.close()
+            release_db_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': LOGOUT_HEADERS,
+        'body': dumps({'success': True, 'message': 'Logged out successfully'}),
+        'isBase64Encoded': False
+    }
+
+
+def sweep_expired_sessions() -> dict:
+    """Удаление просроченных сессий и отзывов пачками по SESSION_SWEEP_BATCH строк"""
+    schema = SCHEMA
+    result = {'sessions': 0, 'revoked_tokens': 0, 'rate_limits': 0}
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            sweeps = (
+                ('user_sessions', 'id', 'sessions'),
+                ('revoked_tokens', 'token_id', 'revoked_tokens'),
+                ('auth_rate_limits', 'key', 'rate_limits')
+            )
+            for table, key, counter in sweeps:
+                for _ in range(SESSION_SWEEP_MAX_BATCHES):
+                    # Короткая транзакция на пачку; SKIP LOCKED не ждёт конкурирующие запросы
+                    cur.execute(
+                        f"""
+                        DELETE FROM \"{schema}\".{table}
+                        WHERE {key} IN (
+                            SELECT {key} FROM \"{schema}\".{table}
+                            WHERE expires_at < %s
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        """,
+                        (datetime.utcnow(), SESSION_SWEEP_BATCH)
+                    )
+                    deleted = cur.rowcount
+                    conn.commit()
+                    result[counter] += deleted
+                    if deleted < SESSION_SWEEP_BATCH:
+                        break
+    finally:
+        release_db_connection(conn)
+    return result
+
+
+def sweep_sessions(event: dict) -> dict:
+    """Очистка просроченных сессий (по ключу планировщика или токену администратора)"""
+    sweep_key = os.environ.get('SESSION_SWEEP_KEY', '')
+    provided_key = event.get('headers', {}).get('X-Sweep-Key', '')
+    authorized = bool(sweep_key) and secrets.compare_digest(provided_key, sweep_key)
+    
+    if not authorized:
+        auth_header = event.get('headers', {}).get('X-Authorization', '')
+        payload = verify_jwt_token(auth_header.replace('Bearer ', '')) if auth_header.startswith('Bearer ') else None
+        authorized = bool(payload) and payload.get('role') == 'admin'
+    
+    if not authorized:
+        return error_response('Unauthorized', 401)
     
     return {
         'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Credentials': 'true',
-            'X-Set-Cookie': 'session_token=; HttpOnly; Secure; SameSite=Strict; Max-Age=0; Path=/'
-        },
-        'body': json.dumps({'success': True, 'message': 'Logged out successfully'}),
+        'headers': JSON_HEADERS,
+        'body': dumps({'success': True, 'deleted': sweep_expired_sessions()}),
         'isBase64Encoded': False
     }
 
@@ -306,11 +1015,24 @@ def error_response(message: str, status_code: int) -> dict:
     """Стандартный ответ с ошибкой"""
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Credentials': 'true'
-        },
-        'body': json.dumps({'success': False, 'error': message}),
+        'headers': JSON_HEADERS,
+        'body': dumps({'success': False, 'error': message}),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+
+if WARMUP_ON_IMPORT:
+    # Ошибка прогрева не должна ломать загрузку функции: первый запрос подключится сам
+    try:
+        warm_up()
+    except Exception:
+        pass
+
+
+if __name__ == '__main__':
+    # Запуск очистки из cron: python index.py sweep_sessions
+    if sys.argv[1:] == ['sweep_sessions']:
+        print(json.dumps(sweep_expired_sessions()))
+    else:
+        print('Usage: python index.py sweep_sessions')
+        sys.exit(2)
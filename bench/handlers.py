@@ -0,0 +1,407 @@
+"""
+Нагрузочный бенчмарк обработчиков backend/api и backend/auth на локальном Postgres.
+
+Создаёт временную базу, применяет db_migrations, наполняет её данными
+нужного масштаба и вызывает handler(event, context) напрямую: проверки
+из tests.json плюс синтетическая смесь запросов страницы. Для каждого
+эндпоинта считает p50/p95/p99, число запросов к БД и прочитанных строк.
+
+    python bench/handlers.py --dsn postgresql://postgres@localhost/postgres \\
+        [--scale 10k|100k|1m] [--requests 200] [--output result.json] \\
+        [--baseline previous.json --tolerance 20]
+
+С --baseline сравнивает p95 с прошлым результатом и завершается с кодом 1,
+если какой-то эндпоинт стал медленнее больше чем на tolerance процентов.
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+import psycopg2.extensions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+# Статистика pg_stat_user_tables попадает в представление не мгновенно
+STATS_SETTLE_SECONDS = 0.7
+
+SKILLS = (
+    'Python', 'React', 'TypeScript', 'JavaScript', 'Go', 'Java', 'Kotlin', 'Swift',
+    'PostgreSQL', 'Redis', 'Kafka', 'Docker', 'Kubernetes', 'Linux', 'Django', 'FastAPI',
+    'Vue', 'Angular', 'Figma', 'SQL', 'Airflow', 'Spark', 'Terraform', 'GraphQL'
+)
+ROLES = ('Developer', 'Engineer', 'Designer', 'Analyst', 'Manager', 'Architect')
+LEVELS = ('Junior', 'Middle', 'Senior', 'Lead')
+LOCATIONS = ('Москва', 'Санкт-Петербург', 'Удаленно', 'Казань', 'Новосибирск')
+EMPLOYMENT_TYPES = ('full_time', 'part_time', 'remote', 'contract')
+
+
+# Число SQL, выполненных обработчиками обеих функций
+QUERY_COUNTER = {'executed': 0}
+
+
+def counting_cursor(base):
+    """Подкласс курсора функции, считающий выполненные запросы"""
+    class CountingCursor(base):
+        def execute(self, query, vars=None):
+            QUERY_COUNTER['executed'] += 1
+            return super().execute(query, vars)
+    return CountingCursor
+
+
+def load_module(name: str):
+    """Загрузка backend/<name>/index.py как отдельного модуля"""
+    spec = importlib.util.spec_from_file_location(f'{name}_index', os.path.join(ROOT, 'backend', name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    original_connect = module._connect
+    cursor_factory = counting_cursor(module.TracingCursor)
+
+    def counting_connect(*args):
+        conn = original_connect(*args)
+        conn.cursor_factory = cursor_factory
+        return conn
+
+    module._connect = counting_connect
+    return module
+
+
+def create_database(dsn: str, name: str) -> str:
+    """Пересоздание временной базы, возвращает её DSN"""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    conn.close()
+    return psycopg2.extensions.make_dsn(dsn, dbname=name)
+
+
+def drop_database(dsn: str, name: str):
+    """Удаление временной базы"""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    conn.close()
+
+
+def apply_migrations(dsn: str):
+    """Применение db_migrations по порядку версий"""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    for path in sorted(glob.glob(os.path.join(ROOT, 'db_migrations', 'V*.sql'))):
+        with open(path) as f, conn.cursor() as cur:
+            cur.execute(f.read())
+    conn.close()
+
+
+def seed(dsn: str, vacancies: int, skills_per_resume: int):
+    """Наполнение базы: компании, вакансии, пользователи с резюме и навыками"""
+    companies = max(vacancies // 50, 10)
+    users = max(vacancies // 10, 100)
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO companies (name, description, rating, reviews_count, website)
+            SELECT 'Company ' || i, 'Компания номер ' || i, round((random() * 5)::numeric, 2),
+                   (random() * 500)::int, 'https://company' || i || '.example.com'
+            FROM generate_series(1, %s) AS i
+            """,
+            (companies,)
+        )
+        cur.execute(
+            """
+            INSERT INTO vacancies (company_id, title, description, salary_min, salary_max,
+                                   location, employment_type, experience_required, is_active, created_at)
+            SELECT 1 + (i * 7919) %% %(companies)s,
+                   (%(levels)s)[1 + i %% 4] || ' ' || (%(skills)s)[1 + i %% %(skill_count)s] || ' ' || (%(roles)s)[1 + i %% 6],
+                   'Разработка на ' || (%(skills)s)[1 + i %% %(skill_count)s] || ' и '
+                       || (%(skills)s)[1 + (i / 7) %% %(skill_count)s] || '. ' || repeat('Описание вакансии. ', 20),
+                   salary, salary + 50000 + (i %% 5) * 20000,
+                   (%(locations)s)[1 + i %% 5], (%(employment_types)s)[1 + i %% 4],
+                   i %% 8, i %% 10 <> 0,
+                   now() AT TIME ZONE 'UTC' - make_interval(secs => i * 30)
+            FROM generate_series(1, %(vacancies)s) AS i,
+                 LATERAL (SELECT 50000 + (i %% 40) * 10000 AS salary) s
+            """,
+            {
+                'companies': companies, 'vacancies': vacancies, 'skills': list(SKILLS),
+                'skill_count': len(SKILLS), 'levels': list(LEVELS), 'roles': list(ROLES),
+                'locations': list(LOCATIONS), 'employment_types': list(EMPLOYMENT_TYPES)
+            }
+        )
+        cur.execute(
+            """
+            INSERT INTO users (email, password_hash, full_name, role)
+            SELECT 'user' || i || '@bench.example.com', 'x', 'User ' || i,
+                   CASE WHEN i %% 20 = 0 THEN 'employer' ELSE 'user' END
+            FROM generate_series(1, %s) AS i
+            """,
+            (users,)
+        )
+        cur.execute(
+            """
+            INSERT INTO resumes (user_id, position, experience_years, desired_salary, summary)
+            SELECT id, 'Developer', id % 10, 100000 + (id % 30) * 10000, 'Резюме ' || id
+            FROM users
+            """
+        )
+        cur.execute(
+            """
+            INSERT INTO skills (resume_id, skill_name, proficiency_level)
+            SELECT r.id, (%(skills)s)[1 + (r.id + k) %% %(skill_count)s], 'intermediate'
+            FROM resumes r, generate_series(0, %(per_resume)s - 1) AS k
+            """,
+            {'skills': list(SKILLS), 'skill_count': len(SKILLS), 'per_resume': min(skills_per_resume, len(SKILLS))}
+        )
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute('VACUUM ANALYZE')
+    conn.close()
+    return {'companies': companies, 'vacancies': vacancies, 'users': users, 'skills_per_resume': skills_per_resume}
+
+
+def make_event(method: str, params: dict, body=None, headers: dict = None) -> dict:
+    """Событие в формате облачной функции"""
+    return {
+        'httpMethod': method,
+        'queryStringParameters': params,
+        'headers': headers or {},
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+
+def tests_json_events(name: str) -> list:
+    """Сценарии из backend/<name>/tests.json: (эндпоинт, фабрика события, ожидаемый статус)"""
+    with open(os.path.join(ROOT, 'backend', name, 'tests.json')) as f:
+        tests = json.load(f)['tests']
+    events = []
+    for test in tests:
+        params = dict(parse_qsl(urlsplit(test['path']).query))
+        body = test.get('body')
+
+        def factory(n, method=test['method'], params=params, body=body):
+            # Регистрация с одним email прошла бы только один раз
+            if params.get('action') == 'register':
+                body = dict(body, email=f'bench-{n}-{body["email"]}')
+            return make_event(method, params, body)
+
+        events.append((f'{name}: {test["name"]}', factory, test['expectedStatus']))
+    return events
+
+
+def synthetic_events(api, headers: dict, vacancies: int) -> list:
+    """Смесь запросов первой загрузки страницы и поиска"""
+    first_page = json.loads(api.handler(make_event('GET', {'resource': 'vacancies', 'action': 'list'}), None)['body'])
+    cursor = first_page['next_cursor']
+    queries = ('python', 'react developer', 'senior go', 'разработка', 'kubernetes engineer')
+    return [
+        ('vacancies.list', lambda n: make_event('GET', {'resource': 'vacancies', 'action': 'list'}), 200),
+        ('vacancies.list.page2', lambda n: make_event('GET', {'resource': 'vacancies', 'action': 'list', 'cursor': cursor}), 200),
+        ('vacancies.list.filters', lambda n: make_event('GET', {
+            'resource': 'vacancies', 'action': 'list', 'salary_from': str(100000 + (n % 20) * 10000),
+            'location': LOCATIONS[n % len(LOCATIONS)]
+        }), 200),
+        ('vacancies.list.facets', lambda n: make_event('GET', {
+            'resource': 'vacancies', 'action': 'list', 'facets': '1', 'employment_type': EMPLOYMENT_TYPES[n % 4]
+        }), 200),
+        ('vacancies.search', lambda n: make_event('GET', {
+            'resource': 'vacancies', 'action': 'search', 'q': queries[n % len(queries)]
+        }), 200),
+        ('vacancies.get', lambda n: make_event('GET', {
+            'resource': 'vacancies', 'action': 'get', 'id': str(1 + (n * 7919) % vacancies)
+        }), 200),
+        ('vacancies.recommended', lambda n: make_event('GET', {'resource': 'vacancies', 'action': 'recommended'}, headers=headers), 200),
+        ('companies.list', lambda n: make_event('GET', {'resource': 'companies', 'action': 'list'}), 200),
+        ('resumes.my', lambda n: make_event('GET', {'resource': 'resumes', 'action': 'my'}, headers=headers), 200),
+        ('batch.page_load', lambda n: make_event('POST', {'resource': 'batch'}, {'requests': [
+            {'id': 'vacancies', 'resource': 'vacancies', 'action': 'list'},
+            {'id': 'companies', 'resource': 'companies', 'action': 'list'},
+            {'id': 'me', 'resource': 'me'},
+            {'id': 'resume', 'resource': 'resumes', 'action': 'my'}
+        ]}, headers), 200)
+    ]
+
+
+def rows_scanned(dsn: str) -> int:
+    """Сумма прочитанных строк по всем таблицам (seq + index)"""
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute('SELECT COALESCE(SUM(seq_tup_read + COALESCE(idx_tup_fetch, 0)), 0) FROM pg_stat_user_tables')
+        total = int(cur.fetchone()[0])
+    conn.close()
+    return total
+
+
+def close_pool(module):
+    """Закрытие соединений пула, чтобы бэкенды сбросили статистику"""
+    with module._pool_lock:
+        connections = list(module._pool)
+        module._pool.clear()
+    for conn in connections:
+        module._discard_connection(conn, 'recycled')
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль по отсортированному списку (метод ближайшего ранга)"""
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def run_endpoint(modules: dict, dsn: str, factory, expected_status: int, module, requests: int, warmup: int) -> dict:
+    """Прогон одного эндпоинта: задержки, ошибки, запросы к БД и строки"""
+    for n in range(warmup):
+        module.handler(factory(-n - 1), None)
+    for m in modules.values():
+        close_pool(m)
+    time.sleep(STATS_SETTLE_SECONDS)
+    rows_before = rows_scanned(dsn)
+    queries_before = QUERY_COUNTER['executed']
+
+    latencies, errors = [], 0
+    for n in range(requests):
+        event = factory(n)
+        started = time.perf_counter()
+        response = module.handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response['statusCode'] not in (expected_status, 304):
+            errors += 1
+
+    queries = QUERY_COUNTER['executed'] - queries_before
+    for m in modules.values():
+        close_pool(m)
+    time.sleep(STATS_SETTLE_SECONDS)
+    rows = rows_scanned(dsn) - rows_before
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_request': round(queries / requests, 2),
+        'rows_scanned_per_request': round(rows / requests, 1)
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Эндпоинты, у которых p95 вырос больше допустимого"""
+    regressions = []
+    for name, result in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        growth = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        if growth > tolerance:
+            regressions.append({'endpoint': name, 'p95_ms': result['p95_ms'],
+                                'baseline_p95_ms': previous['p95_ms'], 'growth_pct': round(growth, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL', 'postgresql://postgres@localhost/postgres'),
+                        help='подключение к серверу, на котором создаётся временная база')
+    parser.add_argument('--database', default='job_search_bench')
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--skills-per-resume', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на эндпоинт')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--response-cache', action='store_true', help='не отключать кэш ответов процесса')
+    parser.add_argument('--only', help='подстрока имени эндпоинта')
+    parser.add_argument('--keep', action='store_true', help='не удалять временную базу')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='допустимый рост p95, %%')
+    args = parser.parse_args()
+
+    dsn = create_database(args.dsn, args.database)
+    try:
+        apply_migrations(dsn)
+        started = time.perf_counter()
+        dataset = seed(dsn, SCALES[args.scale], args.skills_per_resume)
+        dataset['seed_seconds'] = round(time.perf_counter() - started, 1)
+
+        os.environ['DATABASE_URL'] = dsn
+        os.environ['MAIN_DB_SCHEMA'] = 'public'
+        # Строки трассировки смешались бы с результатами в stdout
+        os.environ.setdefault('TRACE_SAMPLE_RATE', '0')
+        # Все события бенчмарка приходят с одного «IP» и упёрлись бы в лимит входа
+        os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+        if not args.response_cache:
+            os.environ['RESPONSE_CACHE_TTL'] = '0'
+        modules = {'api': load_module('api'), 'auth': load_module('auth')}
+        api, auth = modules['api'], modules['auth']
+
+        registered = auth.handler(make_event('POST', {'action': 'register'}, {
+            'email': 'bench@example.com', 'password': 'bench-password', 'full_name': 'Bench'
+        }), None)
+        headers = {'X-Authorization': 'Bearer ' + json.loads(registered['body'])['token']}
+        api.handler(make_event('POST', {'resource': 'resumes', 'action': 'create'}, {
+            'position': 'Developer', 'experience_years': 4, 'desired_salary': 200000,
+            'skills': [{'name': name} for name in SKILLS[:args.skills_per_resume]]
+        }, headers), None)
+        # Логин из tests.json должен находить своего пользователя
+        for _, factory, _ in tests_json_events('auth'):
+            event = factory(0)
+            if event['queryStringParameters'].get('action') == 'login':
+                credentials = json.loads(event['body'])
+                auth.handler(make_event('POST', {'action': 'register'}, dict(credentials, full_name='Test')), None)
+
+        scenarios = [(name, factory, status, api) for name, factory, status in tests_json_events('api')]
+        scenarios += [(name, factory, status, auth) for name, factory, status in tests_json_events('auth')]
+        scenarios += [(name, factory, status, api) for name, factory, status in synthetic_events(api, headers, dataset['vacancies'])]
+
+        endpoints = {}
+        for name, factory, status, module in scenarios:
+            if args.only and args.only not in name:
+                continue
+            endpoints[name] = run_endpoint(modules, dsn, factory, status, module, args.requests, args.warmup)
+            print(json.dumps({'endpoint': name, **endpoints[name]}, ensure_ascii=False))
+
+        with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+            cur.execute('SHOW server_version')
+            server_version = cur.fetchone()[0]
+        for module in modules.values():
+            close_pool(module)
+    finally:
+        if not args.keep:
+            drop_database(args.dsn, args.database)
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'scale': args.scale,
+        'dataset': dataset,
+        'response_cache': args.response_cache,
+        'python': sys.version.split()[0],
+        'postgres': server_version,
+        'endpoints': endpoints
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(json.dumps({'regression': regression}, ensure_ascii=False))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
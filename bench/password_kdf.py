@@ -0,0 +1,74 @@
+"""
+Бенчмарк хеширования паролей backend/auth: логинов в секунду на ядро
+для разных значений PASSWORD_SCRYPT_N.
+
+    python bench/password_kdf.py [--costs 4096,16384,65536] [--seconds 3] [--output result.json]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_auth_module():
+    """Загрузка backend/auth/index.py как отдельного модуля"""
+    spec = importlib.util.spec_from_file_location('auth_index', os.path.join(ROOT, 'backend', 'auth', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(auth, cost: int, seconds: float, threads: int) -> float:
+    """Число проверок пароля в секунду при заданной параллельности"""
+    auth.PASSWORD_SCRYPT_N = cost
+    hashed = auth.hash_password('benchmark-password')
+    deadline = time.perf_counter() + seconds
+
+    def worker() -> int:
+        done = 0
+        while time.perf_counter() < deadline:
+            assert auth.verify_password('benchmark-password', hashed)
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', default='4096,8192,16384,32768,65536')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    auth = load_auth_module()
+    cores = os.cpu_count() or 1
+    results = []
+    for cost in (int(c) for c in args.costs.split(',')):
+        single = measure(auth, cost, args.seconds, 1)
+        parallel = measure(auth, cost, args.seconds, cores)
+        results.append({
+            'scrypt_n': cost,
+            'scrypt_r': auth.PASSWORD_SCRYPT_R,
+            'scrypt_p': auth.PASSWORD_SCRYPT_P,
+            'logins_per_sec_per_core': round(single, 1),
+            'logins_per_sec_all_cores': round(parallel, 1),
+            'ms_per_login': round(1000 / single, 2) if single else None
+        })
+        print(json.dumps(results[-1]))
+
+    report = {'cores': cores, 'workers': auth.PASSWORD_HASH_WORKERS, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Бенчмарк холодного старта backend/api и backend/auth: время загрузки index.py
+в чистом интерпретаторе, самые тяжёлые импорты и какие из отложенных
+модулей всё же загрузились при импорте.
+
+    python bench/startup.py [--runs 10] [--output result.json] \\
+        [--baseline previous.json --tolerance 20]
+
+С --baseline сравнивает медиану времени импорта с прошлым результатом и
+завершается с кодом 1, если она выросла больше чем на tolerance процентов.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = ('api', 'auth')
+# Модули, которые index.py импортирует только внутри обработчиков
+DEFERRED_MODULES = ('jwt', 'gzip', 'csv', 'psycopg2.extras', 'concurrent.futures')
+TOP_IMPORTS = 10
+
+# Выполняется в отдельном процессе, чтобы кэш sys.modules был пустым
+LOADER = """
+import importlib.util, json, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('index', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({'import_ms': elapsed, 'loaded': [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def load_once(name: str, importtime: bool = False) -> tuple:
+    """Загрузка index.py в новом интерпретаторе: (результат, вывод -X importtime)"""
+    path = os.path.join(ROOT, 'backend', name, 'index.py')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', LOADER, path, *DEFERRED_MODULES]
+    env = dict(os.environ, WARMUP_ON_IMPORT='0')
+    completed = subprocess.run(command, capture_output=True, text=True, env=env, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def heaviest_imports(importtime_log: str) -> list:
+    """Импорты верхнего уровня с наибольшим суммарным временем"""
+    imports = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Вложенные импорты выводятся с отступом, нас интересуют только прямые
+        if module.startswith('  '):
+            continue
+        imports.append({'module': module.strip(), 'cumulative_ms': round(int(cumulative) / 1000, 2)})
+    imports.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+    return imports[:TOP_IMPORTS]
+
+
+def measure(name: str, runs: int) -> dict:
+    """Медиана и разброс времени импорта функции"""
+    timings, loaded = [], []
+    for _ in range(runs):
+        result, _ = load_once(name)
+        timings.append(result['import_ms'])
+        loaded = result['loaded']
+    _, importtime_log = load_once(name, importtime=True)
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'deferred_loaded': loaded,
+        'heaviest_imports': heaviest_imports(importtime_log)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='допустимый рост медианы, %%')
+    args = parser.parse_args()
+
+    functions = {}
+    for name in FUNCTIONS:
+        functions[name] = measure(name, args.runs)
+        print(json.dumps({'function': name, **functions[name]}, ensure_ascii=False))
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': sys.version.split()[0],
+        'functions': functions
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, result in functions.items():
+            previous = baseline.get('functions', {}).get(name)
+            if not previous or not previous.get('median_ms'):
+                continue
+            growth = (result['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100
+            if growth > args.tolerance:
+                regressions.append({'function': name, 'median_ms': result['median_ms'],
+                                    'baseline_median_ms': previous['median_ms'], 'growth_pct': round(growth, 1)})
+        for regression in regressions:
+            print(json.dumps({'regression': regression}, ensure_ascii=False))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+-- Ключи сортировки для keyset-пагинации не должны быть NULL
+UPDATE vacancies SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE vacancies ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE companies SET rating = 0.0 WHERE rating IS NULL;
+ALTER TABLE companies ALTER COLUMN rating SET NOT NULL;
+
+-- Индекс для списка активных вакансий (ORDER BY created_at DESC, id DESC)
+CREATE INDEX idx_vacancies_active_created ON vacancies(created_at DESC, id DESC) WHERE is_active = TRUE;
+
+-- Индекс для списка компаний (ORDER BY rating DESC, id DESC)
+CREATE INDEX idx_companies_rating ON companies(rating DESC, id DESC);
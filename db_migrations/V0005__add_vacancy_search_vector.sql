@@ -0,0 +1,10 @@
+-- Полнотекстовый поиск по вакансиям (русская и английская морфология)
+ALTER TABLE vacancies ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX idx_vacancies_search_vector ON vacancies USING GIN (search_vector);
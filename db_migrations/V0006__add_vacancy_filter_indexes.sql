@@ -0,0 +1,8 @@
+-- Индексы для фильтров списка активных вакансий
+CREATE INDEX idx_vacancies_active_location ON vacancies(location, created_at DESC, id DESC) WHERE is_active = TRUE;
+CREATE INDEX idx_vacancies_active_employment ON vacancies(employment_type, created_at DESC, id DESC) WHERE is_active = TRUE;
+CREATE INDEX idx_vacancies_active_salary ON vacancies((COALESCE(salary_max, salary_min))) WHERE is_active = TRUE;
+
+-- Покрывающий индекс для подсчёта фасетов через index-only scan
+CREATE INDEX idx_vacancies_active_facets ON vacancies(location, employment_type)
+    INCLUDE (salary_min, salary_max, experience_required) WHERE is_active = TRUE;
@@ -0,0 +1,4 @@
+-- Внешний идентификатор вакансии из фидов партнёров для upsert при импорте
+ALTER TABLE vacancies ADD COLUMN external_id VARCHAR(255);
+
+CREATE UNIQUE INDEX idx_vacancies_company_external_id ON vacancies(company_id, external_id);
@@ -0,0 +1,48 @@
+-- Денормализованный счётчик активных вакансий компании
+ALTER TABLE companies ADD COLUMN active_vacancies_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE companies c
+SET active_vacancies_count = (
+    SELECT COUNT(*) FROM vacancies v WHERE v.company_id = c.id AND v.is_active = TRUE
+);
+
+-- Поддержание счётчика при вставке, удалении и смене активности/компании вакансии
+CREATE OR REPLACE FUNCTION vacancies_active_count_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.is_active IS NOT DISTINCT FROM NEW.is_active
+       AND OLD.company_id = NEW.company_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_active THEN
+        UPDATE companies SET active_vacancies_count = active_vacancies_count - 1 WHERE id = OLD.company_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_active THEN
+        UPDATE companies SET active_vacancies_count = active_vacancies_count + 1 WHERE id = NEW.company_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER trg_vacancies_active_count
+    AFTER INSERT OR DELETE OR UPDATE OF is_active, company_id ON vacancies
+    FOR EACH ROW EXECUTE FUNCTION vacancies_active_count_trigger();
+
+-- Исправление расхождений счётчика; возвращает число исправленных компаний
+CREATE OR REPLACE FUNCTION reconcile_company_vacancy_counts() RETURNS INTEGER AS $$
+DECLARE
+    fixed INTEGER;
+BEGIN
+    UPDATE companies c
+    SET active_vacancies_count = actual.cnt
+    FROM (
+        SELECT c2.id, COUNT(v.id) AS cnt
+        FROM companies c2
+        LEFT JOIN vacancies v ON v.company_id = c2.id AND v.is_active = TRUE
+        GROUP BY c2.id
+    ) actual
+    WHERE c.id = actual.id AND c.active_vacancies_count <> actual.cnt;
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
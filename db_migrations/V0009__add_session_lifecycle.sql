@@ -0,0 +1,20 @@
+-- Идентификатор JWT (jti), выданного вместе с сессией
+ALTER TABLE user_sessions ADD COLUMN token_id VARCHAR(64);
+
+-- UNIQUE(session_token) уже создаёт индекс, отдельный индекс лишний
+DROP INDEX idx_sessions_token;
+
+-- Индексы для очистки просроченных сессий и ограничения числа сессий пользователя
+CREATE INDEX idx_sessions_expires_at ON user_sessions(expires_at);
+CREATE INDEX idx_sessions_user_created ON user_sessions(user_id, created_at DESC);
+DROP INDEX idx_sessions_user_id;
+
+-- Отозванные JWT до истечения их срока действия
+CREATE TABLE revoked_tokens (
+    token_id VARCHAR(64) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE INDEX idx_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
@@ -0,0 +1,11 @@
+-- Общие корзины токенов ограничителя частоты входа и регистрации для нескольких
+-- экземпляров функции. UNLOGGED: счётчики не нужно восстанавливать после сбоя
+CREATE UNLOGGED TABLE auth_rate_limits (
+    key VARCHAR(64) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    -- Момент, когда корзина снова полна и строку можно удалить при очистке
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX idx_auth_rate_limits_expires_at ON auth_rate_limits(expires_at);
@@ -0,0 +1,26 @@
+-- updated_at — ключ инкрементальной выгрузки (updated_since и курсор), не должен быть NULL
+UPDATE vacancies SET updated_at = created_at WHERE updated_at IS NULL;
+ALTER TABLE vacancies ALTER COLUMN updated_at SET NOT NULL;
+
+UPDATE companies SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+ALTER TABLE companies ALTER COLUMN updated_at SET NOT NULL;
+
+-- updated_at обновляется при любом изменении строки, а не только там, где его выставляет код
+CREATE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_vacancies_updated_at
+    BEFORE UPDATE ON vacancies
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+CREATE TRIGGER trg_companies_updated_at
+    BEFORE UPDATE ON companies
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Индексы для выгрузки (ORDER BY updated_at, id с фильтром updated_since)
+CREATE INDEX idx_vacancies_updated ON vacancies(updated_at, id);
+CREATE INDEX idx_companies_updated ON companies(updated_at, id);
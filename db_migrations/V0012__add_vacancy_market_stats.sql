@@ -0,0 +1,59 @@
+-- Предрассчитанная статистика рынка: перцентили зарплат по городам, типам занятости,
+-- словам из названий и компаниям. Обновляется REFRESH MATERIALIZED VIEW CONCURRENTLY
+-- по расписанию и после массового импорта, чтения не блокируются
+CREATE MATERIALIZED VIEW vacancy_market_stats AS
+WITH active AS (
+    SELECT v.title, v.location, v.employment_type, v.salary_min, v.salary_max,
+           v.company_id, c.name AS company_name
+    FROM vacancies v
+    JOIN companies c ON v.company_id = c.id
+    WHERE v.is_active = TRUE
+),
+dimensions AS (
+    SELECT 'all' AS dimension, '' AS key, NULL AS label, salary_min, salary_max FROM active
+    UNION ALL
+    SELECT 'location', location, NULL, salary_min, salary_max FROM active WHERE location IS NOT NULL
+    UNION ALL
+    SELECT 'employment_type', employment_type, NULL, salary_min, salary_max FROM active WHERE employment_type IS NOT NULL
+    UNION ALL
+    SELECT 'company', company_id::TEXT, company_name, salary_min, salary_max FROM active
+    UNION ALL
+    -- Каждое слово названия считается один раз на вакансию
+    SELECT 'title_keyword', k.word, NULL, a.salary_min, a.salary_max
+    FROM active a
+    CROSS JOIN LATERAL (
+        SELECT DISTINCT word FROM regexp_split_to_table(lower(a.title), '[^[:alnum:]]+') AS word
+        WHERE length(word) >= 3
+    ) k
+)
+SELECT
+    dimension,
+    key,
+    MAX(label) AS label,
+    COUNT(*) AS vacancies_count,
+    ROUND(percentile_cont(0.25) WITHIN GROUP (ORDER BY salary_min))::INTEGER AS salary_min_p25,
+    ROUND(percentile_cont(0.5) WITHIN GROUP (ORDER BY salary_min))::INTEGER AS salary_min_p50,
+    ROUND(percentile_cont(0.75) WITHIN GROUP (ORDER BY salary_min))::INTEGER AS salary_min_p75,
+    ROUND(percentile_cont(0.25) WITHIN GROUP (ORDER BY salary_max))::INTEGER AS salary_max_p25,
+    ROUND(percentile_cont(0.5) WITHIN GROUP (ORDER BY salary_max))::INTEGER AS salary_max_p50,
+    ROUND(percentile_cont(0.75) WITHIN GROUP (ORDER BY salary_max))::INTEGER AS salary_max_p75
+FROM dimensions
+GROUP BY dimension, key
+-- Редкие слова не дают осмысленных перцентилей и раздувают витрину
+HAVING dimension <> 'title_keyword' OR COUNT(*) >= 3;
+
+-- Уникальный индекс обязателен для REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX idx_vacancy_market_stats_key ON vacancy_market_stats(dimension, key);
+
+-- Журнал обновлений витрины: время последнего обновления отдаётся в ответе
+CREATE TABLE stats_refresh_log (
+    id SERIAL PRIMARY KEY,
+    view_name VARCHAR(64) NOT NULL,
+    source VARCHAR(20) NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    finished_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_stats_refresh_log_view ON stats_refresh_log(view_name, finished_at DESC);
+
+INSERT INTO stats_refresh_log (view_name, source, duration_ms) VALUES ('vacancy_market_stats', 'migration', 0);